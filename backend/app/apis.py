@@ -1,36 +1,74 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Query # type: ignore
-from fastapi.responses import StreamingResponse # type: ignore
+import anyio # type: ignore
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Header, Query, Request # type: ignore
+from fastapi.concurrency import run_in_threadpool # type: ignore
+from fastapi.responses import Response, StreamingResponse # type: ignore
 from sqlalchemy.orm import Session # type: ignore
-from sqlalchemy import or_, func, desc # type: ignore
+from sqlalchemy import or_, func, desc, insert, select, update # type: ignore
+from sqlalchemy.ext.asyncio import AsyncSession # type: ignore
+from sqlalchemy.exc import IntegrityError # type: ignore
 from app.models import User, UserProfile, UserFriendship, Round, RoundPlayer, Gelbfeld, UserStatistics
-from app.utils import hash_password, verify_password, whoami, create_access_token
-from app.database import get_db
-from app.schemas import BetaTesterRequest, RegisterRequest, TokenRequest, CreateRoundInput, PlayerInput, AddPointInput, LoginRequest, BioRequest, AddFriendRequest, SearchUsersRequest
-from uuid import uuid4
+from app.utils import PasswordPoolSaturated, hash_password, verify_password, password_needs_rehash, create_access_token
+from app.auth import CurrentUser, authenticate, get_current_user, get_current_user_async, resolve_user
+from app.database import SessionLocal, get_async_db, get_async_sessionmaker, get_db
+from app.events import round_events, format_sse
+from app.pictures import (
+    MAX_UPLOAD_BYTES, InvalidImage, UploadTooLarge, etag_matches,
+    has_variants, picture_response, render_avatar_variants, save_upload
+)
+from app.avatars import assign_profile_picture, blob_path, claim_blob, release_blob, render_lock, temp_upload_path
+from app.statistics import record_round_joined, record_point
+from app.rollups import GLOBAL_SCOPE, activity, record_gelbfelder
+from app.scoreboard_cache import scoreboard_cache
+from app.search import search_users as find_users
+from app.profiling import ProfiledRoute
+from app.friend_events import InvalidEventId, friend_events, publish_friend_event
+from app.friend_state import CHANGE_LOG_SIZE, changed_friendship_ids, current_version, load_friend_state, record_friendship_change
+from app.history import decode_cursor as decode_history_cursor, history_page, iter_history
+from app.schemas import BetaTesterRequest, RegisterRequest, TokenRequest, CreateRoundInput, PlayerInput, AddPointInput, AddPointsBatchInput, LoginRequest, BioRequest, AddFriendRequest, SearchUsersRequest
+from app.schemas import (
+    ActivityResponse, FriendEventsResponse, FriendsResponse, FriendStateResponse, IncomingRequestsResponse, LeaderboardResponse,
+    MyStatisticsResponse, OutgoingRequestsResponse, RoundHistoryEntry, RoundHistoryPage, TokenResponse,
+    UserSearchResult, WhoAmIResponse
+)
+from collections import Counter
+from typing import List, Literal, Optional
+import asyncio
 import datetime
+import logging
 import os
-import shutil
 
-UPLOAD_DIR = "uploads"
+STREAM_KEEPALIVE_SECONDS = 15
+LONG_POLL_MAX_SECONDS = 30
+MAX_POINT_EVENTS_PER_BATCH = 500
+logger = logging.getLogger(__name__)
 
-router = APIRouter()
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
 
-@router.post("/register")
-def register_user(request: RegisterRequest, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.username == request.username).first()
+router = APIRouter(route_class=ProfiledRoute)
+
+@router.post("/register", response_model=TokenResponse)
+async def register_user(request: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
+    # Compare normalized forms so they hit the lower() indexes
+    existing_user = await db.scalar(select(User.id).where(func.lower(User.username) == request.username.lower()).limit(1))
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already taken")
-    
-    existing_email = db.query(User).filter(User.email == request.email).first()
+
+    existing_email = await db.scalar(select(User.id).where(func.lower(User.email) == request.email.lower()).limit(1))
     if existing_email:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = hash_password(request.password)
+    # Awaited on the event loop; a full password pool answers 503 without taking a thread
+    hashed_password = await hash_password(request.password)
 
     db_user = User(username=request.username, email=request.email, password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Lost a race against a concurrent registration of the same name/email
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Username or email already registered")
 
     access_token = create_access_token(data={"email": request.email})
 
@@ -38,133 +76,108 @@ def register_user(request: RegisterRequest, db: Session = Depends(get_db)):
 
 
 
-@router.post("/login")
-def login_user(request: LoginRequest, db: Session = Depends(get_db)):
+@router.post("/login", response_model=TokenResponse)
+async def login_user(request: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     username_or_email_lower = request.username_or_email.lower()
 
-    user = db.query(User).filter(
+    # Two seeks on the lower(username)/lower(email) expression indexes
+    user = await db.scalar(select(User).where(
         or_(
             func.lower(User.username) == username_or_email_lower,
             func.lower(User.email) == username_or_email_lower
         )
-    ).first()
+    ).limit(1))
 
     if not user:
         raise HTTPException(status_code=400, detail="Invalid username or password")
 
-    if not verify_password(request.password, user.password):
+    if not await verify_password(request.password, user.password):
         raise HTTPException(status_code=400, detail="Invalid username or password")
 
+    # Upgrade the stored hash when the configured bcrypt cost changed
+    if password_needs_rehash(user.password):
+        try:
+            user.password = await hash_password(request.password)
+            await db.commit()
+        except PasswordPoolSaturated:
+            pass
+
     access_token = create_access_token(data={"email": user.email})
 
     return {"access_token": access_token, "token_type": "bearer"}
 
-@router.post("/whoami")
-def whoami_endpoint(request: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(request.token)
-    if email is None:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+@router.post("/whoami", response_model=WhoAmIResponse)
+async def whoami_endpoint(user: CurrentUser = Depends(get_current_user_async)):
     return {"username": user.username, "email": user.email}
 
 @router.post("/upload_profile_picture")
-def upload_profile_picture(
+async def upload_profile_picture(
     token: str = Form(...),
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    # Get user's email from token
-    email = whoami(token)
-    user = db.query(User).filter(User.email == email).first()
+    user = await run_in_threadpool(resolve_user, token, db)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     _, ext = os.path.splitext(file.filename.lower())
 
     # Validate file type
-    allowed_extensions = {".png", ".jpg", ".jpeg", ".gif"}
+    allowed_extensions = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
 
         # Validate extension and content type
     if ext not in allowed_extensions or not file.content_type.startswith("image/"):
-        print(f"Invalid file type: {file.content_type}, extension: {ext}")
-        raise HTTPException(status_code=400, detail="Only image files (.png, .jpg, .jpeg, .gif) are allowed.")
-
-    # Generate secure unique filename
-    ext = os.path.splitext(file.filename)[1].lower()
-    filename = f"{uuid4().hex}{ext}"
-    file_location = os.path.join(UPLOAD_DIR, filename)
-
-    # Save the new file
-    with open(file_location, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-
-    # Get or create profile
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).first()
-    if not profile:
-        profile = UserProfile(user_id=user.id)
-        db.add(profile)
-        db.commit()
-        db.refresh(profile)
-
-    # Delete the old profile picture if it exists and is not the default
-    old_path = profile.profile_picture
-    if old_path and os.path.exists(old_path) and not old_path.endswith("no_profile_picture.jpg"):
-        try:
-            os.remove(old_path)
-        except Exception as e:
-            print(f"Failed to delete old profile picture: {e}")
-
-    # Update with new picture
-    profile.profile_picture = file_location
-    db.commit()
+        logger.info("Rejected profile picture upload", extra={"content_type": file.content_type, "extension": ext})
+        raise HTTPException(status_code=400, detail="Only image files (.png, .jpg, .jpeg, .gif, .webp) are allowed.")
+
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Profile pictures are limited to {MAX_UPLOAD_BYTES} bytes")
+
+    # Hash while writing, then store the picture under its content hash
+    temp_location = temp_upload_path()
+    try:
+        digest = await run_in_threadpool(save_upload, file.file, temp_location)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"Profile pictures are limited to {MAX_UPLOAD_BYTES} bytes")
+
+    file_location = await run_in_threadpool(blob_path, db, digest, ext)
+    # Referenced from here on, so the garbage collector leaves the files alone
+    await run_in_threadpool(claim_blob, db, digest, file_location)
+    claimed = True
+    try:
+        async with render_lock(digest):
+            if not has_variants(file_location):
+                await render_avatar_variants(temp_location, file_location)
+                os.replace(temp_location, file_location)
+        # Shielded, so a cancelled request still knows whether the profile took over the claim
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(assign_profile_picture, db, user.id, file_location)
+            claimed = False
+    except InvalidImage:
+        raise HTTPException(status_code=400, detail="The uploaded file is not a readable image.")
+    finally:
+        if os.path.exists(temp_location):
+            os.remove(temp_location)
+        if claimed:
+            # Any failure, including a cancelled request, gives the reference back
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(release_blob, db, file_location)
 
     return {"info": "Profile picture uploaded.", "path": file_location}
 
 @router.post("/profile_picture")
 def get_profile_picture(
-    token_request: TokenRequest,
+    request: Request,
+    size: Optional[int] = Query(None, ge=1),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Extract email from token
-    email = whoami(token_request.token)
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).first()
-    
-    # Use custom profile picture if it exists, else fallback
-    if profile and profile.profile_picture and os.path.exists(profile.profile_picture):
-        file_path = profile.profile_picture
-    else:
-        file_path = "/home/jasper/workspace/GelbApp/backend/app/assets/no_profile.jpg" 
-
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=500, detail="Default profile picture missing")
-
-    def iterfile():
-        with open(file_path, mode="rb") as file_like:
-            yield from file_like
-
-    # Determine content-type
-    ext = os.path.splitext(file_path)[1].lower()
-    content_type = {
-        ".png": "image/png",
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".gif": "image/gif"
-    }.get(ext, "application/octet-stream")
-
-    return StreamingResponse(iterfile(), media_type=content_type)
+    profile_picture = db.query(UserProfile.profile_picture).filter(UserProfile.user_id == user.id).scalar()
+    return picture_response(request, profile_picture, size)
 
 @router.post("/update_bio")
 def update_bio(request: BioRequest, db: Session = Depends(get_db)):
-    email = whoami(request.token)
-    user = db.query(User).filter(User.email == email).first()
+    user = resolve_user(request.token, db)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -181,8 +194,7 @@ def update_bio(request: BioRequest, db: Session = Depends(get_db)):
 
 @router.post("/add_friend")
 def add_friend(req: AddFriendRequest, db: Session = Depends(get_db)):
-    email = whoami(req.token)
-    user = db.query(User).filter(User.email == email).first()
+    user = resolve_user(req.token, db)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -214,20 +226,26 @@ def add_friend(req: AddFriendRequest, db: Session = Depends(get_db)):
     ).first()
 
     if rejected_friendship:
+        record_friendship_change(db, rejected_friendship.id, (user.id, friend.id))
         db.delete(rejected_friendship)
         db.commit()  # commit the delete before new insert
         
     new_friendship = UserFriendship(user_id=user.id, friend_id=friend.id, status="pending")
     db.add(new_friendship)
+    db.flush()
+    record_friendship_change(db, new_friendship.id, (user.id, friend.id))
     db.commit()
 
+    publish_friend_event(friend.id, {
+        "type": "friend_request",
+        "request_id": new_friendship.id,
+        "from_user_id": user.id,
+        "username": user.username,
+    })
     return {"message": "Friend request sent."}
 
 @router.post("/accept_friend")
-def accept_friend(request_id: int, token: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(token.token)
-    user = db.query(User).filter(User.email == email).first()
-
+def accept_friend(request_id: int, user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
     friendship = db.query(UserFriendship).filter(
         UserFriendship.id == request_id,
         UserFriendship.friend_id == user.id,
@@ -238,15 +256,20 @@ def accept_friend(request_id: int, token: TokenRequest, db: Session = Depends(ge
         raise HTTPException(status_code=404, detail="Friend request not found")
 
     friendship.status = "accepted"
+    record_friendship_change(db, friendship.id, (friendship.user_id, friendship.friend_id))
     db.commit()
 
+    publish_friend_event(friendship.user_id, {
+        "type": "friend_request_accepted",
+        "request_id": friendship.id,
+        "user_id": user.id,
+        "username": user.username,
+    })
+
     return {"message": "Friend request accepted"}
 
 @router.post("/reject_friend")
-def reject_friend(request_id: int, token: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(token.token)
-    user = db.query(User).filter(User.email == email).first()
-
+def reject_friend(request_id: int, user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
     friendship = db.query(UserFriendship).filter(
         UserFriendship.id == request_id,
         UserFriendship.friend_id == user.id,
@@ -257,15 +280,20 @@ def reject_friend(request_id: int, token: TokenRequest, db: Session = Depends(ge
         raise HTTPException(status_code=404, detail="Friend request not found")
 
     friendship.status = "rejected"
+    record_friendship_change(db, friendship.id, (friendship.user_id, friendship.friend_id))
     db.commit()
 
+    publish_friend_event(friendship.user_id, {
+        "type": "friend_request_rejected",
+        "request_id": friendship.id,
+        "user_id": user.id,
+        "username": user.username,
+    })
+
     return {"message": "Friend request rejected"}
 
 @router.post("/cancel_friend_request")
-def cancel_friend_request(request_id: int, token: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(token.token)
-    user = db.query(User).filter(User.email == email).first()
-
+def cancel_friend_request(request_id: int, user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
     friendship = db.query(UserFriendship).filter(
         UserFriendship.id == request_id,
         UserFriendship.user_id == user.id,
@@ -275,16 +303,14 @@ def cancel_friend_request(request_id: int, token: TokenRequest, db: Session = De
     if not friendship:
         raise HTTPException(status_code=404, detail="Request not found")
 
+    record_friendship_change(db, friendship.id, (friendship.user_id, friendship.friend_id))
     db.delete(friendship)
     db.commit()
 
     return {"message": "Friend request canceled"}
 
 @router.delete("/remove_friend/{friend_id}")
-def remove_friend(friend_id: int, token: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(token.token)
-    user = db.query(User).filter(User.email == email).first()
-
+def remove_friend(friend_id: int, user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
     friendship = db.query(UserFriendship).filter(
         ((UserFriendship.user_id == user.id) & (UserFriendship.friend_id == friend_id)) |
         ((UserFriendship.user_id == friend_id) & (UserFriendship.friend_id == user.id)),
@@ -294,103 +320,184 @@ def remove_friend(friend_id: int, token: TokenRequest, db: Session = Depends(get
     if not friendship:
         raise HTTPException(status_code=404, detail="Friend not found")
 
+    record_friendship_change(db, friendship.id, (friendship.user_id, friendship.friend_id))
     db.delete(friendship)
     db.commit()
 
     return {"message": "Friend removed"}
 
-@router.post("/friends")
-def list_friends(request: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(request.token)
-    user = db.query(User).filter(User.email == email).first()
-
-    friendships = db.query(UserFriendship).filter(
-        ((UserFriendship.user_id == user.id) | (UserFriendship.friend_id == user.id)) &
-        (UserFriendship.status == "accepted")
-    ).all()
-
-    friends = []
-    for f in friendships:
-        friend_id = f.friend_id if f.user_id == user.id else f.user_id
-        friend = db.query(User).filter(User.id == friend_id).first()
-        friends.append({
-            "id": friend.id,
-            "username": friend.username,
-            "email": friend.email
-        })
+@router.post("/friends", response_model=FriendsResponse)
+async def list_friends(user: CurrentUser = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    # Resolve the other side of every accepted friendship in a single join
+    friends = (await db.execute(select(User.id, User.username, User.email).join(
+        UserFriendship,
+        ((UserFriendship.user_id == user.id) & (UserFriendship.friend_id == User.id)) |
+        ((UserFriendship.friend_id == user.id) & (UserFriendship.user_id == User.id))
+    ).where(UserFriendship.status == "accepted").order_by(UserFriendship.id))).all()
 
     return {"friends": friends}
 
-@router.post("/friend_requests/incoming")
-def incoming_requests(request: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(request.token)
-    user = db.query(User).filter(User.email == email).first()
+@router.post("/friends/state", response_model=FriendStateResponse)
+async def friends_state(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0),
+    user: CurrentUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Friends, incoming and outgoing requests in one response, for polling clients.
+
+    Returns 304 while If-None-Match or ``since`` still name the current version.
+    With an older ``since`` the response is a delta: drop every entry whose
+    friendship_id/request_id is in ``changed``, then add the returned entries.
+    """
+    version = await current_version(db, user.id)
+    etag = f'"friends-{user.id}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if since == version or etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    # The lists are read after the version, so they are never older than it
+    if since is not None and version - CHANGE_LOG_SIZE <= since < version:
+        changed = await changed_friendship_ids(db, user.id, since)
+        state = await load_friend_state(db, user.id, changed)
+        state.update(delta=True, changed=changed)
+    else:
+        state = await load_friend_state(db, user.id)
+        state.update(delta=False, changed=[])
+
+    response.headers.update(headers)
+    return {"version": version, **state}
+
+@router.post("/friends/events", response_model=FriendEventsResponse)
+async def friend_events_poll(
+    request: TokenRequest,
+    last_event_id: Optional[str] = Query(None),
+    wait: float = Query(25, ge=0, le=LONG_POLL_MAX_SECONDS)
+):
+    """Long-poll for friend request events after ``last_event_id``, waiting up to ``wait`` seconds.
+
+    Without ``last_event_id`` only events from now on are returned; pass the
+    returned ``last_event_id`` to the next call. ``reset`` means events were
+    missed and /friends/state should be refetched.
+    """
+    user = await authenticate(request.token)
+    try:
+        batch = await friend_events.read(user.id, last_event_id, wait)
+    except InvalidEventId:
+        raise HTTPException(status_code=400, detail="Invalid last_event_id")
+    return {"events": batch.events, "last_event_id": batch.last_event_id, "reset": batch.reset}
+
+@router.post("/friends/events/stream")
+async def friend_events_stream(
+    request: Request,
+    token_request: TokenRequest,
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-Sent Events of friend request events.
+
+    Starts with a ``ready`` event carrying the position to resume from; on
+    reconnect send it back as Last-Event-ID (or ``last_event_id``). A ``reset``
+    event means events were missed and /friends/state should be refetched.
+    """
+    user = await authenticate(token_request.token)
+    after = last_event_id_header or last_event_id
+    try:
+        first = await friend_events.read(user.id, after, 0)
+    except InvalidEventId:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    async def event_stream():
+        batch = first
+        # Before the replayed backlog, the resume position is still the requested one
+        start = after if after is not None and not batch.reset else batch.last_event_id
+        yield format_sse("reset" if batch.reset else "ready", {"last_event_id": start}, start)
+        while True:
+            for event in batch.events:
+                yield format_sse(event["type"], event, event["id"])
+            if await request.is_disconnected():
+                break
+            batch = await friend_events.read(user.id, batch.last_event_id, STREAM_KEEPALIVE_SECONDS)
+            if batch.reset:
+                yield format_sse("reset", {"last_event_id": batch.last_event_id}, batch.last_event_id)
+            elif not batch.events:
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-    requests = db.query(UserFriendship).filter(
+@router.post("/friend_requests/incoming", response_model=IncomingRequestsResponse)
+def incoming_requests(user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    requests = db.query(
+        UserFriendship.id.label("request_id"), UserFriendship.user_id.label("from_user_id"), User.username
+    ).join(
+        User, User.id == UserFriendship.user_id
+    ).filter(
         UserFriendship.friend_id == user.id,
         UserFriendship.status == "pending"
-    ).all()
-
-    result = [
-        {"request_id": f.id, "from_user_id": f.user_id, "username": db.query(User).get(f.user_id).username}
-        for f in requests
-    ]
-    return {"incoming_requests": result}
+    ).order_by(UserFriendship.id).all()
 
-@router.post("/friend_requests/outgoing")
-def outgoing_requests(request: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(request.token)
-    user = db.query(User).filter(User.email == email).first()
+    return {"incoming_requests": requests}
 
-    requests = db.query(UserFriendship).filter(
+@router.post("/friend_requests/outgoing", response_model=OutgoingRequestsResponse)
+def outgoing_requests(user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    requests = db.query(
+        UserFriendship.id.label("request_id"), UserFriendship.friend_id.label("to_user_id"), User.username
+    ).join(
+        User, User.id == UserFriendship.friend_id
+    ).filter(
         UserFriendship.user_id == user.id,
         UserFriendship.status == "pending"
-    ).all()
+    ).order_by(UserFriendship.id).all()
 
-    result = [
-        {"request_id": f.id, "to_user_id": f.friend_id, "username": db.query(User).get(f.friend_id).username}
-        for f in requests
-    ]
-    return {"outgoing_requests": result}
+    return {"outgoing_requests": requests}
 
-@router.post("/search_users")
-def search_users(request: SearchUsersRequest, db: Session = Depends(get_db)):
-    email = whoami(request.token)
-    current_user = db.query(User).filter(User.email == email).first()
+@router.post("/search_users", response_model=List[UserSearchResult])
+def search_users(request: SearchUsersRequest, response: Response, db: Session = Depends(get_db)):
+    current_user = resolve_user(request.token, db)
 
     if not current_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    results = db.query(User).filter(
-        ((User.username.ilike(f"%{request.query}%")) | (User.email.ilike(f"%{request.query}%"))) &
-        (User.id != current_user.id)
-    ).limit(10).all()
-
-    users_with_status = []
-    for user in results:
-        friendship = db.query(UserFriendship).filter(
-            ((UserFriendship.user_id == current_user.id) & (UserFriendship.friend_id == user.id)) |
-            ((UserFriendship.user_id == user.id) & (UserFriendship.friend_id == current_user.id))
-        ).first()
-
-        status = friendship.status if friendship else "none"
-        users_with_status.append({
+    try:
+        results, next_cursor = find_users(db, request.query, current_user.id, request.limit, request.cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # The body stays a plain list; the next page is announced in a header
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    # Fetch the friendship status for all hits with one IN query
+    hit_ids = [user.id for user in results]
+    statuses = {}
+    if hit_ids:
+        friendships = db.query(UserFriendship.user_id, UserFriendship.friend_id, UserFriendship.status).filter(
+            ((UserFriendship.user_id == current_user.id) & (UserFriendship.friend_id.in_(hit_ids))) |
+            ((UserFriendship.friend_id == current_user.id) & (UserFriendship.user_id.in_(hit_ids)))
+        ).order_by(UserFriendship.id).all()
+        for f in friendships:
+            other_id = f.friend_id if f.user_id == current_user.id else f.user_id
+            statuses.setdefault(other_id, f.status)
+
+    users_with_status = [
+        {
             "username": user.username,
             "email": user.email,
-            "status": status
-        })
+            "status": statuses.get(user.id, "none")
+        }
+        for user in results
+    ]
 
     return users_with_status
 
 @router.post("/rounds/create")
 def create_round(data: CreateRoundInput, db: Session = Depends(get_db)):
-    print("Creating round with data:", data)
-
-    email = whoami(data.token)
-    if not email:
-        return {"error": "Invalid token"}
-
-    creator = db.query(User).filter_by(email=email).first()
+    creator = resolve_user(data.token, db)
     if not creator:
         return {"error": "User not found for the provided token"}
 
@@ -411,29 +518,27 @@ def create_round(data: CreateRoundInput, db: Session = Depends(get_db)):
     new_round = Round(name=data.name, creator_id=creator.id)
     db.add(new_round)
     db.flush() 
+    logger.info("Creating round", extra={"round_id": new_round.id, "creator_id": creator.id, "players": len(data.players)})
 
     creator_player = RoundPlayer(round_id=new_round.id, user_id=creator.id)
     db.add(creator_player)
+    player_user_ids = [creator.id]
 
     for player_data in data.players:
         if player_data.user_id is not None:
             user = db.query(User).filter_by(id=player_data.user_id).first()
             if not user:
-                print(f"User with ID {player_data.user_id} not found, skipping player addition.")
+                logger.warning("Skipping unknown player", extra={"round_id": new_round.id, "user_id": player_data.user_id})
                 continue
             round_player = RoundPlayer(round_id=new_round.id, user_id=user.id)
+            player_user_ids.append(user.id)
         elif player_data.guest_name:
             round_player = RoundPlayer(round_id=new_round.id, guest_name=player_data.guest_name)
         else:
             continue 
         db.add(round_player)
 
-    stats = db.query(UserStatistics).filter_by(user_id=creator.id).first()
-    if not stats:
-        stats = UserStatistics(user_id=creator.id, total_rounds=1)
-        db.add(stats)
-    else:
-        stats.total_rounds += 1
+    record_round_joined(db, player_user_ids)
 
     db.commit()
 
@@ -441,44 +546,43 @@ def create_round(data: CreateRoundInput, db: Session = Depends(get_db)):
 
 @router.post("/points/add")
 def add_point(data: AddPointInput, db: Session = Depends(get_db)):
-    valid_token = whoami(data.token)
-    if not valid_token:
+    if not resolve_user(data.token, db):
         return {"error": "Invalid token"}
 
-    player = db.query(RoundPlayer).filter_by(id=data.round_player_id).first()
+    # Increment server-side so concurrent taps cannot overwrite each other
+    player = db.execute(
+        update(RoundPlayer)
+        .where(RoundPlayer.id == data.round_player_id, RoundPlayer.round_id == data.round_id)
+        .values(points=RoundPlayer.points + 1)
+        .returning(RoundPlayer.id, RoundPlayer.user_id, RoundPlayer.points)
+    ).first()
     if not player:
-        return {"error": "Player not found"}
-
-    if player.round_id != data.round_id:
+        db.rollback()
+        if not db.query(RoundPlayer.id).filter_by(id=data.round_player_id).first():
+            return {"error": "Player not found"}
         return {"error": "Player does not belong to the specified round"}
 
-    player.points += 1
-
     gelb = Gelbfeld(
         round_id=data.round_id,
-        round_player_id=player.id
+        round_player_id=player.id,
+        timestamp=datetime.datetime.utcnow()
     )
     db.add(gelb)
+    record_gelbfelder(db, [(player.user_id, data.round_id, gelb.timestamp)])
 
     # Update statistics for real user (not guest)
     if player.user_id:
-        stats = db.query(UserStatistics).filter_by(user_id=player.user_id).first()
-        if not stats:
-            stats = UserStatistics(user_id=player.user_id)
-            db.add(stats)
-
-        stats.total_points = (stats.total_points or 0) + 1
-        stats.total_gelbfelder = (stats.total_gelbfelder or 0) + 1
-
-
-        # Check if best score for the round needs update
-        round_players = db.query(RoundPlayer).filter_by(round_id=data.round_id, user_id=player.user_id).all()
-        max_points = max([rp.points for rp in round_players]) if round_players else 0
-        if stats.best_score_in_round is None or max_points > stats.best_score_in_round:
-            stats.best_score_in_round = max_points
-
+        record_point(db, player.user_id, player.points)
 
     db.commit()
+    scoreboard_cache.invalidate(data.round_id)
+
+    round_events.publish(data.round_id, {
+        "type": "point",
+        "round_id": data.round_id,
+        "player_id": player.id,
+        "points": player.points
+    })
 
     return {
         "message": "Point added",
@@ -487,21 +591,111 @@ def add_point(data: AddPointInput, db: Session = Depends(get_db)):
     }
 
 
-# Update /rounds/create to increment total_rounds
-@router.get("/rounds/{round_id}/scores")
-def get_scores(round_id: int, db: Session = Depends(get_db)):
-    gelbfields = len(db.query(Gelbfeld).filter_by(round_id=round_id).all())
+def _to_utc_naive(timestamp: datetime.datetime) -> datetime.datetime:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
 
+@router.post("/points/add_batch")
+def add_points_batch(data: AddPointsBatchInput, db: Session = Depends(get_db)):
+    """Replay taps collected offline; events already stored (same idempotency key) are skipped."""
+    if not resolve_user(data.token, db):
+        return {"error": "Invalid token"}
 
-    round = db.query(Round).filter_by(id=round_id).first()
+    if len(data.events) > MAX_POINT_EVENTS_PER_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_POINT_EVENTS_PER_BATCH} events per batch")
+
+    # Validate all referenced players against the round in one query
+    player_ids = {e.round_player_id for e in data.events}
+    players = dict(db.query(RoundPlayer.id, RoundPlayer.user_id).filter(
+        RoundPlayer.round_id == data.round_id,
+        RoundPlayer.id.in_(player_ids)
+    ).all()) if player_ids else {}
+    unknown = sorted(player_ids - players.keys())
+    if unknown:
+        return {"error": "Player does not belong to the specified round", "player_ids": unknown}
+
+    keys = {e.idempotency_key for e in data.events}
+    seen = {key for (key,) in db.query(Gelbfeld.client_event_id).filter(
+        Gelbfeld.round_id == data.round_id,
+        Gelbfeld.client_event_id.in_(keys)
+    ).all()} if keys else set()
+
+    new_events = []
+    for e in data.events:
+        if e.idempotency_key in seen:
+            continue
+        seen.add(e.idempotency_key)
+        new_events.append(e)
+
+    scores = {}
+    if new_events:
+        try:
+            db.execute(insert(Gelbfeld), [
+                {
+                    "round_id": data.round_id,
+                    "round_player_id": e.round_player_id,
+                    "timestamp": _to_utc_naive(e.timestamp),
+                    "client_event_id": e.idempotency_key
+                }
+                for e in new_events
+            ])
+            record_gelbfelder(db, [(players[e.round_player_id], data.round_id, _to_utc_naive(e.timestamp)) for e in new_events])
+
+            for player_id, count in Counter(e.round_player_id for e in new_events).items():
+                points = db.execute(
+                    update(RoundPlayer)
+                    .where(RoundPlayer.id == player_id)
+                    .values(points=RoundPlayer.points + count)
+                    .returning(RoundPlayer.points)
+                ).scalar_one()
+                scores[player_id] = (points, count)
+                if players[player_id]:
+                    record_point(db, players[player_id], points, count)
+            db.commit()
+        except IntegrityError:
+            # A concurrent retry stored some of these keys first; the client can resend safely
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Events are being stored by another request, retry")
+        scoreboard_cache.invalidate(data.round_id)
+
+    for player_id, (points, _) in scores.items():
+        round_events.publish(data.round_id, {
+            "type": "point",
+            "round_id": data.round_id,
+            "player_id": player_id,
+            "points": points
+        })
+
+    return {
+        "message": "Points added",
+        "accepted": len(new_events),
+        "duplicates": len(data.events) - len(new_events),
+        "scores": [{"player_id": player_id, "points": points} for player_id, (points, _) in scores.items()]
+    }
+
+def build_scoreboard(db: Session, round_id: int):
+    # COUNT runs on the gelbfelds.round_id index instead of loading every row
+    field_count = db.query(func.count(Gelbfeld.id)).filter(
+        Gelbfeld.round_id == Round.id
+    ).correlate(Round).scalar_subquery()
+
+    round = db.query(Round.name, field_count.label("field_count")).filter(Round.id == round_id).first()
     if not round:
-        return {"error": "Round not found"}
+        return None
+
+    # Players and their usernames in one query instead of a lazy load per player
+    players = db.query(
+        RoundPlayer.id, RoundPlayer.points, RoundPlayer.guest_name, User.username
+    ).outerjoin(User, User.id == RoundPlayer.user_id).filter(
+        RoundPlayer.round_id == round_id
+    ).order_by(RoundPlayer.id).all()
 
     scores = []
-    for p in round.players:
-        if p.user:
+    for p in players:
+        if p.username is not None:
             scores.append({
-                "name": p.user.username,
+                "name": p.username,
                 "points": p.points,
                 "player_id": p.id,
                 "is_guest": False
@@ -514,62 +708,145 @@ def get_scores(round_id: int, db: Session = Depends(get_db)):
                 "is_guest": True,
             })
 
-    return {"round_id": round_id,"field_count":gelbfields ,"round_name": round.name,"player_count": len(round.players),"scores": scores}
+    return {"round_id": round_id,"field_count":round.field_count ,"round_name": round.name,"player_count": len(players),"scores": scores}
+
+@router.get("/rounds/{round_id}/scores")
+async def get_scores(round_id: int, request: Request):
+    """Scoreboard of a round, served from the scoreboard cache; 304 while If-None-Match is current."""
+    cached = scoreboard_cache.get(round_id)
+    if cached is None:
+        version = scoreboard_cache.version(round_id)
+        async with get_async_sessionmaker()() as db:
+            # run_sync executes the ORM queries on the async connection without a thread
+            scoreboard = await db.run_sync(build_scoreboard, round_id)
+        if scoreboard is None:
+            return {"error": "Round not found"}
+        cached = scoreboard_cache.put(round_id, version, scoreboard)
+
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+def _load_scoreboard(round_id: int):
+    db = SessionLocal()
+    try:
+        return build_scoreboard(db, round_id)
+    finally:
+        db.close()
+
+class _ScoreTracker:
+    """Adds the absolute ``field_count`` to point events and drops those the last snapshot already contains.
+
+    Point events carry the player's new total, and totals only grow, so a
+    point committed before the snapshot was read is recognised when its event
+    arrives afterwards, no matter in which order events were published.
+    """
+
+    def __init__(self, scoreboard: dict):
+        self.reset(scoreboard)
+
+    def reset(self, scoreboard: dict):
+        self.points = {score["player_id"]: score["points"] or 0 for score in scoreboard["scores"]}
+        self.field_count = scoreboard["field_count"]
+
+    def apply(self, event: dict) -> Optional[dict]:
+        delta = event["points"] - self.points.get(event["player_id"], 0)
+        if delta <= 0:
+            return None
+        self.points[event["player_id"]] = event["points"]
+        self.field_count += delta
+        return dict(event, field_count=self.field_count)
+
+@router.get("/rounds/{round_id}/stream")
+async def stream_scores(round_id: int, request: Request):
+    """Server-Sent Events: a ``snapshot`` of the scoreboard, then a ``point`` event per scoring player."""
+    # Subscribe before taking the snapshot so no point can fall in between
+    subscription = round_events.subscribe(round_id)
+    scoreboard = await run_in_threadpool(_load_scoreboard, round_id)
+    if scoreboard is None:
+        subscription.close()
+        raise HTTPException(status_code=404, detail="Round not found")
+    tracker = _ScoreTracker(scoreboard)
+
+    async def event_stream():
+        try:
+            yield format_sse("snapshot", scoreboard)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscription.lagged:
+                    subscription.lagged = False
+                    latest = await run_in_threadpool(_load_scoreboard, round_id)
+                    if latest is not None:
+                        tracker.reset(latest)
+                        yield format_sse("snapshot", latest)
+                        continue
+                if event["type"] == "point":
+                    event = tracker.apply(event)
+                    if event is None:
+                        continue
+                yield format_sse(event["type"], event, event["id"])
+                if event["type"] == "round_closed":
+                    break
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.delete("/rounds/{round_id}/delete")
 def delete_round(round_id: int, token_request: str, db: Session = Depends(get_db)):
     round = db.query(Round).filter_by(id=round_id).first()
     if not round:
         return {"error": "Round not found"}
-    print(token)
     if token_request != round.creator_id:
         return {"error": "You are not authorized to delete this round"}
     
     db.delete(round)
     db.commit()
+    scoreboard_cache.invalidate(round_id)
 
     return {"message": "Round deleted"}
 
 @router.post("/profile/change/is_beta_tester")
 def change_is_beta_tester(request: BetaTesterRequest, db: Session = Depends(get_db)):
-    email = whoami(request.token)
-    user = db.query(User).filter(User.email == email).first()
-    print(f"Changing beta tester status for user: {user.username if user else 'Unknown'} to {request.is_beta_tester}")
-
+    user = resolve_user(request.token, db)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.is_beta_tester = request.is_beta_tester
+    logger.info("Changing beta tester status", extra={"user_id": user.id, "is_beta_tester": request.is_beta_tester})
+
+    db.query(User).get(user.id).is_beta_tester = request.is_beta_tester
     db.commit()
 
     return {"message": "Beta tester status updated", "is_beta_tester": request.is_beta_tester}
 
 @router.post("/profile/is_beta_tester")
-def is_beta_tester(token_request: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(token_request.token)
-    user = db.query(User).filter(User.email == email).first()
-
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
+def is_beta_tester(user: CurrentUser = Depends(get_current_user)):
     return {"is_beta_tester": user.is_beta_tester}
 
 # New endpoint to serve player statistics
-@router.post("/statistics/me")
-def get_my_statistics(token_request: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(token_request.token)
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+@router.post("/statistics/me", response_model=MyStatisticsResponse)
+def get_my_statistics(user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    # One pass over the user's rows of the (user_id, points) index
+    total_gelbfelder = db.query(func.count(Gelbfeld.id)).join(
+        RoundPlayer, Gelbfeld.round_player_id == RoundPlayer.id
+    ).filter(RoundPlayer.user_id == user.id).scalar_subquery()
+
+    total_rounds, total_points, best_score_points, total_gelbfelder = db.query(
+        func.count(RoundPlayer.id),
+        func.coalesce(func.sum(RoundPlayer.points), 0),
+        func.coalesce(func.max(RoundPlayer.points), 0),
+        total_gelbfelder
+    ).filter(RoundPlayer.user_id == user.id).one()
 
-    total_rounds = db.query(RoundPlayer).filter_by(user_id=user.id).count()
-    total_points = db.query(RoundPlayer).filter_by(user_id=user.id).with_entities(func.sum(RoundPlayer.points)).scalar() or 0
-    total_gelbfelder = db.query(Gelbfeld).join(RoundPlayer).filter(RoundPlayer.user_id == user.id).count()
-    
-    # Best score in a single round
-    best_score = db.query(RoundPlayer).filter_by(user_id=user.id).order_by(RoundPlayer.points.desc()).first()
-    best_score_points = best_score.points if best_score else 0
-    
     return {
         "username": user.username,
         "total_rounds": total_rounds,
@@ -579,55 +856,83 @@ def get_my_statistics(token_request: TokenRequest, db: Session = Depends(get_db)
     }
 
 # Leaderboard: top players globally
-@router.get("/statistics/leaderboard")
-def global_leaderboard(db: Session = Depends(get_db)):
-    players = db.query(
+@router.get("/statistics/leaderboard", response_model=LeaderboardResponse)
+async def global_leaderboard(db: AsyncSession = Depends(get_async_db)):
+    # Top-k scan over the maintained aggregate (indexed on total_points)
+    players = (await db.execute(select(
         User.username,
-        func.sum(RoundPlayer.points).label("total_points"),
-        func.count(RoundPlayer.id).label("rounds_played"),
-        func.max(RoundPlayer.points).label("best_single_round")
-    ).join(RoundPlayer, RoundPlayer.user_id == User.id).group_by(User.id).order_by(desc("total_points")).limit(10).all()
-    return {
-        "leaderboard": [
-            {
-                "username": player.username,
-                "total_points": player.total_points,
-                "rounds_played": player.rounds_played,
-                "best_single_round": player.best_single_round
-            } for player in players
-        ]
-    }
+        UserStatistics.total_points.label("total_points"),
+        UserStatistics.total_rounds.label("rounds_played"),
+        UserStatistics.best_score_in_round.label("best_single_round")
+    ).join(User, User.id == UserStatistics.user_id).where(
+        UserStatistics.total_rounds > 0
+    ).order_by(desc(UserStatistics.total_points)).limit(10))).all()
+    return {"leaderboard": players}
+
+def _activity(db: Session, user_id: int, period: str, start, end, utc_offset: int):
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return activity(db, user_id, period, start, end, utc_offset)
+
+@router.post("/statistics/me/activity", response_model=ActivityResponse)
+def my_activity(
+    user: CurrentUser = Depends(get_current_user),
+    period: Literal["day", "week", "season"] = Query("day"),
+    start: Optional[datetime.date] = Query(None),
+    end: Optional[datetime.date] = Query(None),
+    utc_offset: int = Query(0, ge=-12, le=14),
+    db: Session = Depends(get_db)
+):
+    """The user's Gelbfelder per day/week/season and per hour of day between ``start`` and ``end`` (inclusive)."""
+    return _activity(db, user.id, period, start, end, utc_offset)
+
+@router.get("/statistics/activity", response_model=ActivityResponse)
+def global_activity(
+    period: Literal["day", "week", "season"] = Query("day"),
+    start: Optional[datetime.date] = Query(None),
+    end: Optional[datetime.date] = Query(None),
+    utc_offset: int = Query(0, ge=-12, le=14),
+    db: Session = Depends(get_db)
+):
+    """Like /statistics/me/activity, over everyone's Gelbfelder (guests included)."""
+    return _activity(db, GLOBAL_SCOPE, period, start, end, utc_offset)
 
 # Optional: Round history for the user
-@router.post("/statistics/my_rounds")
-def my_round_history(token_request: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(token_request.token)
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+@router.post("/statistics/my_rounds", response_model=RoundHistoryPage)
+def my_round_history(
+    user: CurrentUser = Depends(get_current_user),
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    stream: bool = Query(False),
+    db: Session = Depends(get_db)
+):
+    """Newest rounds first, ``limit`` per page; follow ``next_cursor`` for older ones.
 
-    participations = db.query(RoundPlayer).filter_by(user_id=user.id).all()
+    With ``stream=true`` the whole history (from ``cursor`` on) is sent as NDJSON instead.
+    """
+    if cursor:
+        try:
+            decode_history_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    result = []
-    for p in participations:
-        result.append({
-            "round_name": p.round.name,
-            "points": p.points,
-            "date": p.round.created_at
-        })
+    if stream:
+        return StreamingResponse(_stream_round_history(user.id, cursor), media_type="application/x-ndjson")
 
-    return {"rounds": result}
+    rounds, next_cursor = history_page(db, user.id, limit, cursor)
+    return {"rounds": rounds, "next_cursor": next_cursor}
 
-@router.post("/rounds/{round_id}/deactivate")
-def deactivate_round(round_id: int, data: TokenRequest, db: Session = Depends(get_db)):
-    email = whoami(data.token)
-    if not email:
-        raise HTTPException(status_code=401, detail="Invalid token")
+def _stream_round_history(user_id: int, cursor: Optional[str]):
+    # The request's session is closed before the body is sent, so use our own
+    db = SessionLocal()
+    try:
+        for entry in iter_history(db, user_id, cursor):
+            yield RoundHistoryEntry.model_validate(entry).model_dump_json() + "\n"
+    finally:
+        db.close()
 
-    user = db.query(User).filter_by(email=email).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    
+@router.post("/rounds/{round_id}/deactivate")
+def deactivate_round(round_id: int, user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
     round_obj = db.query(Round).filter(Round.id == round_id).first()
     if not round_obj:
         raise HTTPException(status_code=404, detail="Round not found")
@@ -640,37 +945,18 @@ def deactivate_round(round_id: int, data: TokenRequest, db: Session = Depends(ge
 
     round_obj.is_active = False
     db.commit()
+    scoreboard_cache.invalidate(round_id)
+
+    round_events.publish(round_id, {"type": "round_closed", "round_id": round_id})
 
     return {"message": f"Round {round_id} deactivated successfully"}
 
 @router.get("/getProfilePicture/{username}")
-def get_profile_picture_by_username(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
+def get_profile_picture_by_username(username: str, request: Request, size: Optional[int] = Query(None, ge=1), db: Session = Depends(get_db)):
+    user = db.query(User.id, UserProfile.profile_picture).outerjoin(
+        UserProfile, UserProfile.user_id == User.id
+    ).filter(User.username == username).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).first()
-    
-    # Use custom profile picture if it exists, else fallback
-    if profile and profile.profile_picture and os.path.exists(profile.profile_picture):
-        file_path = profile.profile_picture
-    else:
-        file_path = "/home/jasper/workspace/GelbApp/backend/app/assets/no_profile.jpg" 
-
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=500, detail="Default profile picture missing")
-
-    def iterfile():
-        with open(file_path, mode="rb") as file_like:
-            yield from file_like
-
-    # Determine content-type
-    ext = os.path.splitext(file_path)[1].lower()
-    content_type = {
-        ".png": "image/png",
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".gif": "image/gif"
-    }.get(ext, "application/octet-stream")
-
-    return StreamingResponse(iterfile(), media_type=content_type)
\ No newline at end of file
+    return picture_response(request, user.profile_picture, size)
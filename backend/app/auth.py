@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from fastapi import Depends, HTTPException # type: ignore
+from jose import JWTError, jwt # type: ignore
+from sqlalchemy import event, select # type: ignore
+from sqlalchemy.ext.asyncio import AsyncSession # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+
+from app.database import get_async_db, get_async_sessionmaker, get_db
+from app.models import User
+from app.profiling import span
+from app.schemas import TokenRequest
+from app.utils import SECRET_KEY, ALGORITHM
+
+TOKEN_CACHE_SIZE = 4096
+TOKEN_CACHE_TTL_SECONDS = 300
+
+
+class CurrentUser(NamedTuple):
+    id: int
+    username: str
+    email: str
+    is_beta_tester: bool
+
+
+class TokenUserCache:
+    """Bounded LRU of token -> user snapshot, capped by the token's own exp."""
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, ttl: int = TOKEN_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: CurrentUser, token_exp: float):
+        expires_at = min(token_exp, time.time() + self.ttl)
+        with self._lock:
+            self._entries[token] = (user, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            stale = [token for token, (user, _) in self._entries.items() if user.id == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenUserCache()
+
+
+def _token_email(token: str) -> Optional[Tuple[str, float]]:
+    try:
+        with span("jwt"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    email = payload.get("email")
+    if email is None:
+        return None
+    return email, float(payload.get("exp", 0))
+
+
+def _remember(token: str, user: Optional[User], token_exp: float) -> Optional[CurrentUser]:
+    if user is None:
+        return None
+    current = CurrentUser(user.id, user.username, user.email, bool(user.is_beta_tester))
+    token_cache.put(token, current, token_exp)
+    return current
+
+
+def resolve_user(token: str, db: Session) -> Optional[CurrentUser]:
+    """Return the user behind a token, or None if the token or user is invalid.
+
+    Repeat calls with the same token skip both the JWT decode and the user query
+    until the cache entry expires or the user row changes.
+    """
+    if not token:
+        return None
+
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+
+    decoded = _token_email(token)
+    if decoded is None:
+        return None
+    email, token_exp = decoded
+
+    user = db.query(User).filter(User.email == email).first()
+    return _remember(token, user, token_exp)
+
+
+async def resolve_user_async(token: str, db: AsyncSession) -> Optional[CurrentUser]:
+    """resolve_user() for ``async def`` routes; shares its cache."""
+    if not token:
+        return None
+
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+
+    decoded = _token_email(token)
+    if decoded is None:
+        return None
+    email, token_exp = decoded
+
+    result = await db.execute(select(User).where(User.email == email).limit(1))
+    return _remember(token, result.scalars().first(), token_exp)
+
+
+def get_current_user(request: TokenRequest, db: Session = Depends(get_db)) -> CurrentUser:
+    user = resolve_user(request.token, db)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user
+
+
+async def get_current_user_async(request: TokenRequest, db: AsyncSession = Depends(get_async_db)) -> CurrentUser:
+    user = await resolve_user_async(request.token, db)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user
+
+
+async def authenticate(token: str) -> CurrentUser:
+    """get_current_user_async() for long-held responses: its session is closed before it returns."""
+    async with get_async_sessionmaker()() as db:
+        user = await resolve_user_async(token, db)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
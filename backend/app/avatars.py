@@ -0,0 +1,233 @@
+"""Content-addressed profile picture storage.
+
+Uploads are stored once under ``uploads/<sha256><ext>`` no matter how many
+profiles use them; ``avatar_blobs.ref_count`` tracks the profiles pointing at
+each file. Replacing a picture only decrements the count; files are deleted
+later by the background collector once a blob has been unreferenced for
+``AVATAR_GC_GRACE_SECONDS``.
+
+An upload claims its blob (takes a reference) before looking at the files,
+so the collector cannot delete them while the upload renders or assigns
+them, and only the first upload of a picture renders it, under a lock file
+per hash.
+"""
+import asyncio
+import datetime
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+from sqlalchemy.exc import IntegrityError # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+
+from app.database import SessionLocal, upsert_insert_for
+from app.models import AvatarBlob, UserProfile
+from app.pictures import picture_files, remove_picture
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads"
+TEMP_PREFIX = ".upload-"
+RENDER_LOCK_PREFIX = ".render-"
+RENDER_LOCK_POLL_SECONDS = 0.05
+# A lock file this old belongs to a crashed worker
+RENDER_LOCK_STALE_SECONDS = 120
+
+AVATAR_GC_INTERVAL_SECONDS = int(os.environ.get("GELBAPP_AVATAR_GC_INTERVAL_SECONDS", "3600"))
+AVATAR_GC_GRACE_SECONDS = int(os.environ.get("GELBAPP_AVATAR_GC_GRACE_SECONDS", "3600"))
+
+
+def temp_upload_path() -> str:
+    return os.path.join(UPLOAD_DIR, f"{TEMP_PREFIX}{uuid4().hex}.part")
+
+
+def blob_path(db: Session, digest: str, ext: str) -> str:
+    """Where the picture with this hash lives (or will live) in uploads/."""
+    existing = db.query(AvatarBlob.path).filter(AvatarBlob.sha256 == digest).scalar()
+    return existing or os.path.join(UPLOAD_DIR, f"{digest}{ext}")
+
+
+def _acquire(db: Session, digest: str, path: str):
+    now = datetime.datetime.utcnow()
+    upsert_insert = upsert_insert_for(db)
+    if upsert_insert is None:
+        blob = db.query(AvatarBlob).get(digest)
+        if blob is None:
+            db.add(AvatarBlob(sha256=digest, path=path, ref_count=1, updated_at=now))
+        else:
+            blob.ref_count += 1
+        return
+
+    stmt = upsert_insert(AvatarBlob).values(sha256=digest, path=path, ref_count=1, updated_at=now)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[AvatarBlob.sha256],
+        set_={"ref_count": AvatarBlob.ref_count + 1, "updated_at": now},
+    ))
+
+
+def _release(db: Session, path: str):
+    db.query(AvatarBlob).filter(AvatarBlob.path == path).update(
+        {AvatarBlob.ref_count: AvatarBlob.ref_count - 1, AvatarBlob.updated_at: datetime.datetime.utcnow()},
+        synchronize_session=False,
+    )
+
+
+def claim_blob(db: Session, digest: str, path: str):
+    """Take a reference on the blob before touching its files; hand it to assign_profile_picture or release_blob."""
+    _acquire(db, digest, path)
+    db.commit()
+
+
+def release_blob(db: Session, path: str):
+    # The caller may be cleaning up after a failed transaction
+    db.rollback()
+    _release(db, path)
+    db.commit()
+
+
+def _render_lock_path(digest: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"{RENDER_LOCK_PREFIX}{digest}.lock")
+
+
+def _try_lock(path: str) -> bool:
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        pass
+    try:
+        if time.time() - os.path.getmtime(path) > RENDER_LOCK_STALE_SECONDS:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def _unlock(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@asynccontextmanager
+async def render_lock(digest: str):
+    """Exclusive per-picture lock across requests and workers, held while checking and rendering variants."""
+    path = _render_lock_path(digest)
+    while not _try_lock(path):
+        await asyncio.sleep(RENDER_LOCK_POLL_SECONDS)
+    try:
+        yield
+    finally:
+        _unlock(path)
+
+
+def assign_profile_picture(db: Session, user_id: int, path: str):
+    """Point the user's profile at a blob claimed with claim_blob and release the old picture.
+
+    The claim becomes the profile's reference. The swap is a compare-and-set,
+    so concurrent uploads by one user release each replaced picture once.
+    """
+    while True:
+        current = db.query(UserProfile.profile_picture).filter(UserProfile.user_id == user_id).first()
+        if current is None:
+            db.add(UserProfile(user_id=user_id, profile_picture=path))
+            try:
+                db.commit()
+                return
+            except IntegrityError:
+                # Another upload created the profile first
+                db.rollback()
+                continue
+
+        old_path = current.profile_picture
+        swapped = db.query(UserProfile).filter(
+            UserProfile.user_id == user_id,
+            UserProfile.profile_picture.is_(None) if old_path is None else UserProfile.profile_picture == old_path,
+        ).update({UserProfile.profile_picture: path}, synchronize_session=False)
+        if not swapped:
+            db.rollback()
+            continue
+        if old_path:
+            # Re-uploading the current picture gives back the extra claim
+            _release(db, old_path)
+        db.commit()
+        return
+
+
+def _sweep_untracked_files(db: Session, cutoff: datetime.datetime) -> int:
+    # Uploads from before content addressing, pictures replaced back then and
+    # temp files of aborted uploads are not in avatar_blobs at all.
+    if not os.path.isdir(UPLOAD_DIR):
+        return 0
+
+    referenced = {p for (p,) in db.query(UserProfile.profile_picture).filter(UserProfile.profile_picture.isnot(None))}
+    referenced.update(p for (p,) in db.query(AvatarBlob.path))
+    keep = {os.path.normpath(f) for p in referenced for f in picture_files(p)}
+
+    cutoff_ts = cutoff.replace(tzinfo=datetime.timezone.utc).timestamp()
+    removed = 0
+    for entry in os.scandir(UPLOAD_DIR):
+        if not entry.is_file() or os.path.normpath(entry.path) in keep:
+            continue
+        if entry.stat().st_mtime >= cutoff_ts:
+            continue
+        try:
+            os.remove(entry.path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def collect_garbage(db: Session, grace_seconds: int = AVATAR_GC_GRACE_SECONDS) -> int:
+    """Delete blobs unreferenced for longer than the grace period. Returns the number of files removed."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=grace_seconds)
+    orphaned = db.query(AvatarBlob.sha256, AvatarBlob.path).filter(
+        AvatarBlob.ref_count <= 0,
+        AvatarBlob.updated_at < cutoff
+    ).all()
+
+    removed = 0
+    for digest, path in orphaned:
+        # An upload of this picture is in progress; try again next run
+        lock_path = _render_lock_path(digest)
+        if not _try_lock(lock_path):
+            continue
+        try:
+            # Re-check in the DELETE so a blob re-acquired meanwhile survives
+            deleted = db.query(AvatarBlob).filter(
+                AvatarBlob.sha256 == digest,
+                AvatarBlob.ref_count <= 0,
+                AvatarBlob.updated_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+            if deleted:
+                # Uploads that claimed the picture after the DELETE wait for the lock and re-render
+                remove_picture(path)
+                removed += 1
+        finally:
+            _unlock(lock_path)
+
+    return removed + _sweep_untracked_files(db, cutoff)
+
+
+def _collect_once():
+    db = SessionLocal()
+    try:
+        return collect_garbage(db)
+    finally:
+        db.close()
+
+
+async def run_garbage_collector(interval: int = AVATAR_GC_INTERVAL_SECONDS):
+    """Background task started with the app; runs collect_garbage every ``interval`` seconds."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, _collect_once)
+        except Exception:
+            logger.exception("Avatar garbage collection failed")
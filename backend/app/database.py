@@ -1,11 +1,55 @@
-from sqlalchemy import create_engine # type: ignore
+import os
+from sqlalchemy import create_engine, event # type: ignore
 from sqlalchemy.orm import sessionmaker, Session # type: ignore
 from sqlalchemy.ext.declarative import declarative_base # type: ignore
+from sqlalchemy.pool import QueuePool, StaticPool # type: ignore
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./gelbapp.db"
+# Any SQLAlchemy URL works, e.g. postgresql://user:pw@host/gelbapp
+SQLALCHEMY_DATABASE_URL = os.environ.get("GELBAPP_DATABASE_URL", "sqlite:///./gelbapp.db")
+
+POOL_SIZE = int(os.environ.get("GELBAPP_DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.environ.get("GELBAPP_DB_MAX_OVERFLOW", "20"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("GELBAPP_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def is_sqlite(url: str) -> bool:
+    return url.split(":", 1)[0].split("+", 1)[0] == "sqlite"
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.endswith(":memory:") or url.rstrip("/").endswith("sqlite:")
+
+def _engine_options(url: str) -> dict:
+    if not is_sqlite(url):
+        return {"pool_size": POOL_SIZE, "max_overflow": MAX_OVERFLOW, "pool_pre_ping": True}
+    if _is_memory_sqlite(url):
+        # Every connection to :memory: is a new database, so share a single one
+        return {"connect_args": {"check_same_thread": False}, "poolclass": StaticPool}
+    return {
+        "connect_args": {"check_same_thread": False},
+        "poolclass": QueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+    }
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers proceed while add_point writes; NORMAL is durable in WAL mode
+    # except for the last transactions on power loss, and busy_timeout makes writers
+    # wait for the lock instead of failing with "database is locked".
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
 
 # Create the database engine
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options(SQLALCHEMY_DATABASE_URL))
+if is_sqlite(SQLALCHEMY_DATABASE_URL):
+    event.listen(engine, "connect", _set_sqlite_pragmas)
 
 # Create sessionmaker for handling database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -13,6 +57,17 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create the base class for SQLAlchemy models
 Base = declarative_base()
 
+def upsert_insert_for(db: Session):
+    """The dialect's insert() supporting ON CONFLICT, or None if there is none."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert_insert # type: ignore
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert_insert # type: ignore
+    else:
+        return None
+    return upsert_insert
+
 # Dependency to get the database session
 def get_db():
     db = SessionLocal()
@@ -21,3 +76,52 @@ def get_db():
     finally:
         db.close()
 
+def to_async_url(url: str) -> str:
+    scheme, rest = url.split(":", 1)
+    if "+" in scheme:
+        scheme = scheme.split("+", 1)[0]
+    return ASYNC_DRIVERS.get(scheme, scheme) + ":" + rest
+
+ASYNC_DATABASE_URL = os.environ.get("GELBAPP_ASYNC_DATABASE_URL", to_async_url(SQLALCHEMY_DATABASE_URL))
+
+# The async engine is created on first use so the sync-only code paths
+# (scripts, the statistics CLI) do not need aiosqlite/asyncpg installed.
+_async_engine = None
+_async_sessionmaker = None
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine # type: ignore
+
+        options = _engine_options(ASYNC_DATABASE_URL)
+        if is_sqlite(ASYNC_DATABASE_URL):
+            # aiosqlite runs every connection in its own thread already
+            options.pop("connect_args", None)
+            options.pop("poolclass", None)
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, **options)
+        if is_sqlite(ASYNC_DATABASE_URL):
+            event.listen(_async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return _async_engine
+
+def get_async_sessionmaker():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker # type: ignore
+
+        _async_sessionmaker = async_sessionmaker(
+            get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_sessionmaker
+
+# Dependency to get an AsyncSession for `async def` routes
+async def get_async_db():
+    async with get_async_sessionmaker()() as session:
+        yield session
+
+async def dispose_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_sessionmaker = None
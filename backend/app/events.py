@@ -0,0 +1,88 @@
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Subscription:
+    """One listener on a channel, consumed from the event loop it was created on."""
+
+    def __init__(self, hub, channel, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.hub = hub
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # Set when events were dropped; the consumer should send a fresh snapshot
+        self.lagged = False
+
+    def _offer(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.lagged = True
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.hub._remove(self)
+
+
+class EventHub:
+    """In-process pub/sub keyed by channel.
+
+    ``publish`` is safe to call from the sync route threadpool; delivery is
+    handed to each subscriber's event loop, so slow consumers never block the
+    writer. A full subscriber queue drops its oldest event and marks itself
+    as lagged instead of growing without bound.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, channel) -> Subscription:
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event: dict):
+        event = dict(event, id=next(self._ids))
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, event)
+            except RuntimeError:
+                # The subscriber's loop is gone (shutdown); drop it
+                self._remove(subscription)
+
+    def subscriber_count(self, channel) -> int:
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+
+def format_sse(event: str, data: dict, event_id=None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+# Score updates of running rounds, one channel per round id
+round_events = EventHub()
@@ -0,0 +1,257 @@
+"""Push delivery of friend request events.
+
+``add_friend``, ``accept_friend`` and ``reject_friend`` append an event to the
+other user's log once their transaction has committed. Clients hold one
+long-poll or SSE connection and resume with the id of the last event they
+saw; each user's log keeps the latest GELBAPP_FRIEND_EVENT_BUFFER events.
+When a client resumes from an id that is no longer buffered it is told to
+``reset``, i.e. refetch /friends/state, instead of silently missing events.
+
+The log lives in process memory by default, which is only correct with a
+single worker. Set GELBAPP_FRIEND_EVENTS_URL=redis://host:6379/0 (or any
+Redis-compatible server with streams) to share it between workers; that
+needs the redis package.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FRIEND_EVENTS_URL = os.environ.get("GELBAPP_FRIEND_EVENTS_URL", "")
+FRIEND_EVENT_BUFFER = int(os.environ.get("GELBAPP_FRIEND_EVENT_BUFFER", "100"))
+# Memory backend: users whose logs are kept; Redis backend: idle logs expire after this long
+MAX_BUFFERED_USERS = 16384
+REDIS_LOG_TTL_SECONDS = 7 * 24 * 3600
+
+
+class InvalidEventId(ValueError):
+    pass
+
+
+class EventBatch(NamedTuple):
+    events: List[dict]
+    # Resume from here next time
+    last_event_id: str
+    # Events after the requested id were dropped; refetch the full state
+    reset: bool
+
+
+def parse_event_id(event_id: str) -> Tuple[int, int]:
+    """Ids look like Redis stream ids, ``<epoch ms>-<sequence>``, and compare as tuples."""
+    try:
+        epoch, seq = event_id.split("-")
+        parsed = int(epoch), int(seq)
+    except (AttributeError, ValueError):
+        raise InvalidEventId(event_id)
+    if parsed[0] < 0 or parsed[1] < 0:
+        raise InvalidEventId(event_id)
+    return parsed
+
+
+class _UserLog:
+    __slots__ = ("events", "dropped_upto")
+
+    def __init__(self, size: int):
+        self.events = deque(maxlen=size)
+        self.dropped_upto = 0
+
+
+class MemoryEventLog:
+    """Per-user ring buffers in this process.
+
+    Ids are ``<process start ms>-<sequence>``, so an id handed out before a
+    restart is recognised as stale and answered with a reset.
+    """
+
+    def __init__(self, size: int = FRIEND_EVENT_BUFFER, max_users: int = MAX_BUFFERED_USERS):
+        self.size = size
+        self.max_users = max_users
+        self.epoch = int(time.time() * 1000)
+        self._seq = 0
+        # Highest sequence number of any evicted user log
+        self._evicted_upto = 0
+        self._logs = OrderedDict()
+        self._waiters = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def append(self, user_id: int, event: dict) -> str:
+        with self._lock:
+            self._seq += 1
+            event_id = self._id(self._seq)
+            log = self._logs.get(user_id)
+            if log is None:
+                log = self._logs[user_id] = _UserLog(self.size)
+                while len(self._logs) > self.max_users:
+                    _, evicted = self._logs.popitem(last=False)
+                    if evicted.events:
+                        self._evicted_upto = max(self._evicted_upto, parse_event_id(evicted.events[-1]["id"])[1])
+            self._logs.move_to_end(user_id)
+            if len(log.events) == log.events.maxlen:
+                log.dropped_upto = parse_event_id(log.events[0]["id"])[1]
+            log.events.append(dict(event, id=event_id))
+            waiters = list(self._waiters.get(user_id, ()))
+
+        for loop, wakeup in waiters:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # The waiter's loop is gone (shutdown)
+        return event_id
+
+    def _collect(self, user_id: int, after: Optional[str]) -> EventBatch:
+        if after is None:
+            return EventBatch([], self._id(self._seq), False)
+        epoch, seq = parse_event_id(after)
+        if epoch != self.epoch:
+            return EventBatch([], self._id(self._seq), True)
+
+        log = self._logs.get(user_id)
+        if log is None:
+            if seq < self._evicted_upto:
+                return EventBatch([], self._id(self._seq), True)
+            return EventBatch([], after, False)
+        if seq < log.dropped_upto:
+            return EventBatch([], self._id(self._seq), True)
+        events = [event for event in log.events if parse_event_id(event["id"])[1] > seq]
+        return EventBatch(events, events[-1]["id"] if events else after, False)
+
+    async def read(self, user_id: int, after: Optional[str], timeout: float) -> EventBatch:
+        """Events of ``user_id`` after ``after`` (None: from now on), waiting up to ``timeout`` seconds for one."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            wakeup = asyncio.Event()
+            waiter = (loop, wakeup)
+            with self._lock:
+                batch = self._collect(user_id, after)
+                if batch.events or batch.reset:
+                    return batch
+                after = batch.last_event_id
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return batch
+                self._waiters[user_id].add(waiter)
+            try:
+                await asyncio.wait_for(wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    waiters = self._waiters.get(user_id)
+                    if waiters is not None:
+                        waiters.discard(waiter)
+                        if not waiters:
+                            del self._waiters[user_id]
+
+    async def close(self):
+        pass
+
+
+class RedisEventLog:
+    """One capped Redis stream per user, shared by every worker.
+
+    Streams are trimmed to ``size`` entries on every append and expire after
+    REDIS_LOG_TTL_SECONDS without events. Stream ids carry the server's
+    clock, which is what lets a resume tell "no events" from "expired".
+    """
+
+    def __init__(self, url: str, size: int = FRIEND_EVENT_BUFFER, ttl: int = REDIS_LOG_TTL_SECONDS):
+        import redis # type: ignore
+
+        self.url = url
+        self.size = size
+        self.ttl = ttl
+        # Appends happen in the sync route threadpool, reads on the event loop
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._async_client = None
+
+    def _key(self, user_id: int) -> str:
+        return f"gelbapp:friend_events:{user_id}"
+
+    def _reader(self):
+        if self._async_client is None:
+            import redis.asyncio # type: ignore
+
+            self._async_client = redis.asyncio.Redis.from_url(self.url, decode_responses=True)
+        return self._async_client
+
+    def append(self, user_id: int, event: dict) -> str:
+        key = self._key(user_id)
+        pipe = self._client.pipeline()
+        pipe.xadd(key, {"data": json.dumps(event, default=str)}, maxlen=self.size, approximate=False)
+        pipe.expire(key, self.ttl)
+        return pipe.execute()[0]
+
+    async def _head(self, client, key: str) -> str:
+        # Read the clock first: anything appended after an empty check gets a later id
+        seconds, microseconds = await client.time()
+        latest = await client.xrevrange(key, count=1)
+        if latest:
+            return latest[0][0]
+        return f"{seconds * 1000 + microseconds // 1000 - 1}-0"
+
+    async def _is_stale(self, client, key: str, after: str) -> bool:
+        after_id = parse_event_id(after)
+        oldest = await client.xrange(key, count=1)
+        if not oldest:
+            # Missing stream: nothing happened since ``after``, unless it expired in between
+            seconds, _ = await client.time()
+            return after_id[0] < (seconds - self.ttl) * 1000
+        oldest_id = parse_event_id(oldest[0][0])
+        if after_id >= oldest_id:
+            return False
+        return await client.xlen(key) >= self.size or after_id[0] < oldest_id[0] - self.ttl * 1000
+
+    async def read(self, user_id: int, after: Optional[str], timeout: float) -> EventBatch:
+        client = self._reader()
+        key = self._key(user_id)
+        if after is None:
+            after = await self._head(client, key)
+        elif await self._is_stale(client, key, after):
+            return EventBatch([], await self._head(client, key), True)
+
+        block = int(timeout * 1000) or None
+        response = await client.xread({key: after}, count=self.size, block=block)
+        events = []
+        for _, entries in response or ():
+            for event_id, fields in entries:
+                events.append(dict(json.loads(fields["data"]), id=event_id))
+        return EventBatch(events, events[-1]["id"] if events else after, False)
+
+    async def close(self):
+        self._client.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+def create_event_log(url: str = FRIEND_EVENTS_URL):
+    if not url:
+        return MemoryEventLog()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisEventLog(url)
+    raise ValueError(f"Unsupported GELBAPP_FRIEND_EVENTS_URL: {url}")
+
+
+friend_events = create_event_log()
+
+
+def publish_friend_event(user_id: int, event: dict):
+    """Append ``event`` to ``user_id``'s log; call after the change has committed.
+
+    A failing backend is logged and never fails the request: the change is
+    already stored and clients catch up through /friends/state.
+    """
+    try:
+        friend_events.append(user_id, event)
+    except Exception:
+        logger.exception("Could not publish friend event", extra={"user_id": user_id, "type": event.get("type")})
@@ -0,0 +1,158 @@
+"""Versioned friend state for /friends/state.
+
+Every write to ``user_friendships`` calls ``record_friendship_change`` inside
+its transaction. That bumps ``friend_state_versions.version`` for both users
+and logs the friendship id in ``friendship_changes``, so a client that saw
+version N can be sent only the friendships changed since then. The latest
+versions are mirrored in an in-process cache once the transaction commits,
+so an unchanged poll needs no query at all.
+
+Commits in other workers do not reach that cache, so entries are only
+trusted for GELBAPP_FRIEND_VERSION_CACHE_TTL seconds before the version row
+is read again (one primary key lookup).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, delete, event, or_, select # type: ignore
+from sqlalchemy.ext.asyncio import AsyncSession # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+
+from app.database import upsert_insert_for
+from app.models import FriendshipChange, FriendStateVersion, User, UserFriendship
+
+VERSION_CACHE_SIZE = 16384
+# Seconds a cached version is trusted; 0 keeps it until the next local commit (single worker only)
+VERSION_CACHE_TTL = float(os.environ.get("GELBAPP_FRIEND_VERSION_CACHE_TTL", "1"))
+# Deltas reach back this many versions; older clients get the full state
+CHANGE_LOG_SIZE = 100
+
+PENDING_VERSIONS_KEY = "gelbapp_friend_versions"
+
+
+class VersionCache:
+    """Bounded LRU of user id -> latest committed friend state version, with expiry."""
+
+    def __init__(self, maxsize: int = VERSION_CACHE_SIZE, ttl: float = VERSION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            version, expires = entry
+            if self.ttl and expires <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return version
+
+    def advance(self, user_id: int, version: int):
+        # Commits can finish out of order; never move a user's version backwards
+        with self._lock:
+            entry = self._entries.get(user_id)
+            self._entries[user_id] = (max(version, entry[0]) if entry else version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+friend_versions = VersionCache()
+
+
+def _bump_version(db: Session, user_id: int) -> int:
+    upsert_insert = upsert_insert_for(db)
+    if upsert_insert is None:
+        row = db.query(FriendStateVersion).get(user_id)
+        if row is None:
+            row = FriendStateVersion(user_id=user_id, version=0)
+            db.add(row)
+        row.version += 1
+        db.flush()
+        return row.version
+
+    stmt = upsert_insert(FriendStateVersion).values(user_id=user_id, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[FriendStateVersion.user_id],
+        set_={"version": FriendStateVersion.version + 1},
+    ).returning(FriendStateVersion.version)
+    return db.execute(stmt).scalar_one()
+
+
+def record_friendship_change(db: Session, friendship_id: int, user_ids: Iterable[int]):
+    """Bump the friend state of ``user_ids`` because ``friendship_id`` was created, changed or deleted."""
+    pending: Dict[int, int] = db.info.setdefault(PENDING_VERSIONS_KEY, {})
+    for user_id in set(user_ids):
+        version = _bump_version(db, user_id)
+        db.add(FriendshipChange(user_id=user_id, version=version, friendship_id=friendship_id))
+        db.execute(delete(FriendshipChange).where(
+            FriendshipChange.user_id == user_id,
+            FriendshipChange.version <= version - CHANGE_LOG_SIZE,
+        ))
+        pending[user_id] = version
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_versions(session):
+    for user_id, version in session.info.pop(PENDING_VERSIONS_KEY, {}).items():
+        friend_versions.advance(user_id, version)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_versions(session):
+    session.info.pop(PENDING_VERSIONS_KEY, None)
+
+
+async def current_version(db: AsyncSession, user_id: int) -> int:
+    version = friend_versions.get(user_id)
+    if version is None:
+        version = await db.scalar(
+            select(FriendStateVersion.version).where(FriendStateVersion.user_id == user_id)
+        ) or 0
+        friend_versions.advance(user_id, version)
+    return version
+
+
+async def changed_friendship_ids(db: AsyncSession, user_id: int, since: int) -> List[int]:
+    result = await db.execute(
+        select(FriendshipChange.friendship_id).where(
+            FriendshipChange.user_id == user_id,
+            FriendshipChange.version > since,
+        ).distinct()
+    )
+    return list(result.scalars())
+
+
+async def load_friend_state(db: AsyncSession, user_id: int, friendship_ids: Optional[List[int]] = None) -> dict:
+    """Friends plus incoming and outgoing requests in one query, optionally limited to ``friendship_ids``."""
+    other_id = case((UserFriendship.user_id == user_id, UserFriendship.friend_id), else_=UserFriendship.user_id)
+    stmt = select(
+        UserFriendship.id, UserFriendship.user_id, UserFriendship.friend_id, UserFriendship.status,
+        User.id.label("other_id"), User.username, User.email,
+    ).join(User, User.id == other_id).where(
+        or_(UserFriendship.user_id == user_id, UserFriendship.friend_id == user_id),
+        UserFriendship.status.in_(("accepted", "pending")),
+    ).order_by(UserFriendship.id)
+    if friendship_ids is not None:
+        stmt = stmt.where(UserFriendship.id.in_(friendship_ids))
+
+    friends, incoming, outgoing = [], [], []
+    for row in (await db.execute(stmt)).all():
+        if row.status == "accepted":
+            friends.append({"friendship_id": row.id, "id": row.other_id, "username": row.username, "email": row.email})
+        elif row.friend_id == user_id:
+            incoming.append({"request_id": row.id, "from_user_id": row.user_id, "username": row.username})
+        else:
+            outgoing.append({"request_id": row.id, "to_user_id": row.friend_id, "username": row.username})
+    return {"friends": friends, "incoming_requests": incoming, "outgoing_requests": outgoing}
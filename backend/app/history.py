@@ -0,0 +1,67 @@
+"""A user's round history, newest first.
+
+Participations are created together with their round, so ``round_players.id``
+follows round creation order. Pages are keyset-paginated on it and read
+straight from the ``(user_id, id)`` index: fetching page N costs the same
+as page 1, with no sort. ``iter_history`` streams the full history from a
+server-side cursor for the NDJSON mode.
+"""
+import base64
+import json
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session # type: ignore
+
+from app.models import Round, RoundPlayer
+
+STREAM_BATCH_SIZE = 500
+# Largest id SQLite (and a PostgreSQL bigint) can hold
+MAX_PARTICIPATION_ID = 2 ** 63 - 1
+
+
+def encode_cursor(participation_id: int) -> str:
+    raw = json.dumps([participation_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        # Cursors handed out before also carried the round's created_at first
+        participation_id = int(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))[-1])
+    except (ValueError, TypeError, IndexError, KeyError, OverflowError):
+        raise ValueError("Invalid cursor")
+    if not 0 <= participation_id <= MAX_PARTICIPATION_ID:
+        raise ValueError("Invalid cursor")
+    return participation_id
+
+
+def _history_query(db: Session, user_id: int, cursor: Optional[str]):
+    query = db.query(
+        RoundPlayer.id, Round.name, RoundPlayer.points, Round.created_at
+    ).join(Round, Round.id == RoundPlayer.round_id).filter(RoundPlayer.user_id == user_id)
+
+    if cursor:
+        query = query.filter(RoundPlayer.id < decode_cursor(cursor))
+
+    return query.order_by(RoundPlayer.id.desc())
+
+
+def _entry(row) -> dict:
+    return {"round_name": row.name, "points": row.points, "date": row.created_at}
+
+
+def history_page(db: Session, user_id: int, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """Up to ``limit`` entries and the cursor of the next page (None on the last page)."""
+    rows = _history_query(db, user_id, cursor).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return [_entry(row) for row in rows], next_cursor
+
+
+def iter_history(db: Session, user_id: int, cursor: Optional[str] = None) -> Iterator[dict]:
+    """Every entry from ``cursor`` on, fetched in batches so memory use does not grow with history length."""
+    query = _history_query(db, user_id, cursor).execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE)
+    for row in query:
+        yield _entry(row)
@@ -0,0 +1,74 @@
+"""Structured JSON logging that never blocks the request path.
+
+Loggers under ``app`` hand their records to a QueueHandler; a QueueListener
+thread formats them as one JSON object per line and writes them to stderr.
+Fields passed with ``extra={...}`` become keys of the JSON object.
+"""
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_LEVEL = os.environ.get("GELBAPP_LOG_LEVEL", "INFO").upper()
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render message and traceback now, while args and exc_info are still
+        # valid, and keep the traceback out of the message
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+_listener = None
+
+
+def setup_logging(level: str = LOG_LEVEL):
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+    logger = logging.getLogger("app")
+    logger.setLevel(level)
+    logger.addHandler(_QueueHandler(log_queue))
+    logger.propagate = False
+
+
+def shutdown_logging():
+    """Flush the queue and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    _listener = None
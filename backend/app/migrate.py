@@ -0,0 +1,136 @@
+"""Schema migrations (Alembic, see migrations/) and the startup drift check.
+
+At startup the database is upgraded to the latest revision, unless
+GELBAPP_AUTO_MIGRATE=0, in which case ``alembic upgrade head`` has to be run
+by the deployment. Either way the app refuses to start if the database
+revision or its tables and indexes do not match ``app/models.py``, instead
+of serving hot queries without their indexes.
+
+Workers starting together take turns: upgrade and check run on one
+connection holding an exclusive database lock (BEGIN EXCLUSIVE on SQLite, an
+advisory lock on PostgreSQL), so a worker never checks a half-migrated
+schema or runs a migration twice.
+"""
+import os
+import time
+import warnings
+from contextlib import contextmanager
+
+from alembic import command # type: ignore
+from alembic.autogenerate import compare_metadata # type: ignore
+from alembic.config import Config # type: ignore
+from alembic.migration import MigrationContext # type: ignore
+from alembic.script import ScriptDirectory # type: ignore
+from sqlalchemy import inspect, text # type: ignore
+from sqlalchemy.exc import OperationalError # type: ignore
+
+from app.database import Base, engine
+import app.models  # noqa: F401  registers the tables on Base.metadata
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ALEMBIC_INI = os.path.join(BACKEND_DIR, "alembic.ini")
+
+AUTO_MIGRATE = os.environ.get("GELBAPP_AUTO_MIGRATE", "1") == "1"
+
+# The schema databases created by create_all() before migrations existed start from
+LEGACY_REVISION = "0001"
+
+# Managed outside of the models: Alembic's own table and the FTS5 search index (app/search.py)
+UNMANAGED_TABLE_PREFIXES = ("alembic_version", "users_fts")
+
+# How long a worker waits for another one's migration
+MIGRATION_LOCK_TIMEOUT_SECONDS = int(os.environ.get("GELBAPP_MIGRATION_LOCK_TIMEOUT", "300"))
+# Any fixed key works as long as every worker uses the same one
+PG_MIGRATION_LOCK_KEY = 0x6765_6C62
+
+
+class SchemaDriftError(RuntimeError):
+    pass
+
+
+def include_name(name, type_, parent_names):
+    if type_ == "table":
+        return not name.startswith(UNMANAGED_TABLE_PREFIXES)
+    return True
+
+
+def alembic_config() -> Config:
+    return Config(ALEMBIC_INI)
+
+
+def head_revision(config: Config) -> str:
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+def _begin_exclusive(connection):
+    deadline = time.monotonic() + MIGRATION_LOCK_TIMEOUT_SECONDS
+    while True:
+        try:
+            connection.exec_driver_sql("BEGIN EXCLUSIVE")
+            return
+        except OperationalError:
+            # busy_timeout ran out while another worker migrates
+            connection.rollback()
+            if time.monotonic() >= deadline:
+                raise
+
+
+@contextmanager
+def migration_lock():
+    """A connection holding an exclusive lock on the database until the block ends."""
+    with engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect == "sqlite":
+            _begin_exclusive(connection)
+        elif dialect == "postgresql":
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": PG_MIGRATION_LOCK_KEY})
+            connection.commit()
+        try:
+            yield connection
+            connection.commit()
+        finally:
+            if dialect == "postgresql":
+                connection.rollback()
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PG_MIGRATION_LOCK_KEY})
+                connection.commit()
+
+
+def upgrade_database(connection):
+    config = alembic_config()
+    # migrations/env.py runs on this connection, inside the caller's lock
+    config.attributes["connection"] = connection
+    revision = MigrationContext.configure(connection).get_current_revision()
+    has_tables = inspect(connection).has_table("users")
+    if revision is None and has_tables:
+        command.stamp(config, LEGACY_REVISION)
+    command.upgrade(config, "head")
+
+
+def check_schema(connection):
+    """Raise SchemaDriftError unless the database is at head and matches the models."""
+    head = head_revision(alembic_config())
+    context = MigrationContext.configure(connection, opts={
+        "include_name": include_name,
+        "compare_type": False,
+    })
+    revision = context.get_current_revision()
+    if revision != head:
+        raise SchemaDriftError(
+            f"Database is at revision {revision}, the code expects {head}; "
+            f"run `alembic upgrade head` in backend/"
+        )
+    with warnings.catch_warnings():
+        # SQLite cannot reflect the lower() indexes on users, so they are not compared
+        warnings.filterwarnings("ignore", message=".*expression-based index")
+        differences = compare_metadata(context, Base.metadata)
+
+    if differences:
+        details = "\n".join(f"  {difference}" for difference in differences)
+        raise SchemaDriftError(f"Database schema does not match app/models.py:\n{details}")
+
+
+def prepare_database():
+    with migration_lock() as connection:
+        if AUTO_MIGRATE:
+            upgrade_database(connection)
+        check_schema(connection)
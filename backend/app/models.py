@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint, Index, DateTime, Boolean, func
 from app.database import Base
 from sqlalchemy.orm import relationship
 import datetime
@@ -30,6 +30,11 @@ class User(Base):
         cascade="all, delete-orphan"
     )
 
+# Case-insensitive identity: login seeks these instead of scanning users,
+# and registration cannot create "Alice" next to "alice"
+Index('uq_users_username_lower', func.lower(User.username), unique=True)
+Index('uq_users_email_lower', func.lower(User.email), unique=True)
+
 class UserProfile(Base):
     __tablename__ = 'user_profiles'
 
@@ -42,12 +47,21 @@ class UserProfile(Base):
 
     user = relationship("User", back_populates="profile")
 
+class AvatarBlob(Base):
+    """A content-addressed profile picture in uploads/, shared by every profile using it."""
+    __tablename__ = 'avatar_blobs'
+
+    sha256 = Column(String, primary_key=True)
+    path = Column(String, nullable=False, unique=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
 class UserFriendship(Base):
     __tablename__ = 'user_friendships'
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), index=True)
-    friend_id = Column(Integer, ForeignKey("users.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    friend_id = Column(Integer, ForeignKey("users.id"))
     status = Column(String)  # e.g., "pending", "accepted", "blocked"
 
     user = relationship("User", foreign_keys=[user_id], back_populates="friends")
@@ -55,6 +69,29 @@ class UserFriendship(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'friend_id', name='uq_user_friend'),
+        # Friend lists and request inboxes filter one side plus the status
+        Index('ix_user_friendships_user_id_status', 'user_id', 'status'),
+        Index('ix_user_friendships_friend_id_status', 'friend_id', 'status'),
+    )
+
+class FriendStateVersion(Base):
+    """Per-user counter bumped whenever one of the user's friendships changes."""
+    __tablename__ = 'friend_state_versions'
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class FriendshipChange(Base):
+    """Which friendship changed at which of the user's versions; read by /friends/state deltas."""
+    __tablename__ = 'friendship_changes'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False)
+    friendship_id = Column(Integer, nullable=False)  # No FK: the friendship may be deleted
+
+    __table_args__ = (
+        Index('ix_friendship_changes_user_id_version', 'user_id', 'version'),
     )
 
 class Round(Base):
@@ -69,6 +106,11 @@ class Round(Base):
     players = relationship("RoundPlayer", back_populates="round")
     gelbfelder = relationship("Gelbfeld", back_populates="round")
 
+    __table_args__ = (
+        # create_round looks for an active round with the same name
+        Index('ix_rounds_name_is_active', 'name', 'is_active'),
+    )
+
 class RoundPlayer(Base):
     __tablename__ = "round_players"
 
@@ -82,25 +124,53 @@ class RoundPlayer(Base):
     user = relationship("User", back_populates="round_participations", foreign_keys=[user_id])
     gelbfelder = relationship("Gelbfeld", back_populates="player")
 
+    __table_args__ = (
+        # Covers the per-user aggregates in /statistics/me
+        Index('ix_round_players_user_id_points', 'user_id', 'points'),
+        Index('ix_round_players_round_id_user_id', 'round_id', 'user_id'),
+        Index('ix_round_players_guest_name', 'guest_name'),
+        # Round history pages, newest first (app/history.py)
+        Index('ix_round_players_user_id_id', 'user_id', 'id'),
+    )
+
 class Gelbfeld(Base):
     __tablename__ = "gelbfelds"
 
     id = Column(Integer, primary_key=True)
-    round_id = Column(Integer, ForeignKey("rounds.id"), nullable=False)
-    round_player_id = Column(Integer, ForeignKey("round_players.id"), nullable=False)
+    round_id = Column(Integer, ForeignKey("rounds.id"), nullable=False, index=True)
+    round_player_id = Column(Integer, ForeignKey("round_players.id"), nullable=False, index=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    client_event_id = Column(String, nullable=True)  # Idempotency key of offline taps
 
     round = relationship("Round", back_populates="gelbfelder")
     player = relationship("RoundPlayer", back_populates="gelbfelder")
 
+    __table_args__ = (
+        Index('uq_gelbfelds_round_client_event', 'round_id', 'client_event_id', unique=True),
+    )
+
 class UserStatistics(Base):
     __tablename__ = 'user_statistics'
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
     total_rounds = Column(Integer, default=0)
-    total_points = Column(Integer, default=0)
+    total_points = Column(Integer, default=0, index=True)
     total_gelbfelder = Column(Integer, default=0)
     best_score_in_round = Column(Integer, default=0)
 
-    user = relationship("User", backref="statistics")
\ No newline at end of file
+    user = relationship("User", backref="statistics")
+
+class GelbfeldRollup(Base):
+    """Gelbfelder per UTC hour, per user and per round's guests (user_id = -round_id); see app.rollups."""
+    __tablename__ = "gelbfeld_rollups"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    gelbfelder = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('uq_gelbfeld_rollups_user_id_bucket_start', 'user_id', 'bucket_start', unique=True),
+        Index('ix_gelbfeld_rollups_bucket_start', 'bucket_start'),
+    )
@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import HTTPException, Request # type: ignore
+from fastapi.responses import FileResponse, JSONResponse, Response # type: ignore
+
+from app.profiling import span
+
+DEFAULT_PICTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "no_profile.jpg")
+PICTURE_CACHE_CONTROL = "private, max-age=60, must-revalidate"
+ETAG_CACHE_SIZE = 2048
+
+MAX_UPLOAD_BYTES = int(os.environ.get("GELBAPP_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+IMAGE_WORKERS = int(os.environ.get("GELBAPP_IMAGE_WORKERS", "2"))
+COPY_CHUNK_SIZE = 1024 * 1024
+# Room for the multipart boundaries, part headers and the token field around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_PATHS = {"/upload_profile_picture"}
+
+# Every upload is rendered once into these square sizes and formats
+AVATAR_SIZES = (64, 128, 512)
+AVATAR_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+CONTENT_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def save_upload(source, destination: str, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """Copy an upload to disk and return its SHA-256, computed while writing.
+
+    Aborts (and removes the partial file) past ``max_bytes``.
+    """
+    written = 0
+    digest = hashlib.sha256()
+    try:
+        with span("file_io"), open(destination, "wb") as f:
+            for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b""):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+    return digest.hexdigest()
+
+
+def _upload_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Profile pictures are limited to {MAX_UPLOAD_BYTES} bytes")
+
+
+class UploadLimitMiddleware:
+    """Bound the request body of upload routes before the multipart form is parsed.
+
+    A declared Content-Length over the limit is answered with 413 without
+    reading the body; otherwise the body is counted as it arrives, so a
+    chunked or understated request is cut off at the same limit.
+    """
+
+    def __init__(self, app, max_body_bytes: int = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in UPLOAD_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            # The server has already rejected malformed lengths
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_body_bytes:
+                error = _upload_too_large()
+                response = JSONResponse({"detail": error.detail}, status_code=error.status_code, headers={"Connection": "close"})
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # FastAPI re-raises an HTTPException from body parsing as is
+                    raise _upload_too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def has_variants(original_path: str) -> bool:
+    return all(os.path.exists(path) for path in picture_files(original_path))
+
+
+def variant_path(original_path: str, size: int, fmt: str) -> str:
+    stem, _ = os.path.splitext(original_path)
+    return f"{stem}_{size}.{fmt}"
+
+
+def picture_files(original_path: str):
+    """The original upload plus all of its rendered variants."""
+    yield original_path
+    for size in AVATAR_SIZES:
+        for fmt in AVATAR_FORMATS:
+            yield variant_path(original_path, size, fmt)
+
+
+def remove_picture(original_path: str):
+    for path in picture_files(original_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def render_variants(source_path: str, original_path: str):
+    """Decode ``source_path`` once and write every size/format variant of ``original_path``. Runs in a worker process.
+
+    Each variant is written to a temp file of its own and renamed into place,
+    so concurrent renders of the same picture never see each other's partial files.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError # type: ignore
+
+    temp = None
+    try:
+        with Image.open(source_path) as image:
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGB")
+            # Work down from the largest size so each resize starts from a smaller image
+            for size in sorted(AVATAR_SIZES, reverse=True):
+                image = ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+                for fmt, (pil_format, options) in AVATAR_FORMATS.items():
+                    target = variant_path(original_path, size, fmt)
+                    temp = f"{target}.{uuid4().hex}.tmp"
+                    image.save(temp, format=pil_format, **options)
+                    os.replace(temp, target)
+                    temp = None
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+        raise InvalidImage(str(e)) from None
+    finally:
+        if temp is not None and os.path.exists(temp):
+            os.remove(temp)
+
+
+_image_pool = None
+_image_pool_lock = threading.Lock()
+
+
+def _image_pool_context():
+    # Workers must not be forked from the running server: a fork copies its
+    # threads' held locks and open database connections
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is None:
+            _image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=_image_pool_context())
+        return _image_pool
+
+
+def _discard_image_pool(pool: ProcessPoolExecutor):
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is pool:
+            _image_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def render_avatar_variants(source_path: str, original_path: str):
+    """Run render_variants in the image process pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    pool = _get_image_pool()
+    with span("image"):
+        try:
+            await loop.run_in_executor(pool, render_variants, source_path, original_path)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed) and took the pool with it; retry once on a new one
+            _discard_image_pool(pool)
+            await loop.run_in_executor(_get_image_pool(), render_variants, source_path, original_path)
+
+
+def shutdown_image_pool():
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is not None:
+            _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
+
+
+def _strong_etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest() + '"'
+
+
+# The fallback avatar is served from memory; it never changes while running
+with open(DEFAULT_PICTURE_PATH, "rb") as _default_file:
+    DEFAULT_PICTURE = _default_file.read()
+DEFAULT_PICTURE_ETAG = _strong_etag(DEFAULT_PICTURE)
+
+_etags = OrderedDict()
+_etags_lock = threading.Lock()
+
+
+def file_etag(path: str, stat_result: os.stat_result) -> str:
+    """Content hash of ``path``, recomputed only when its size or mtime change."""
+    key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+    with _etags_lock:
+        etag = _etags.get(key)
+        if etag is not None:
+            _etags.move_to_end(key)
+            return etag
+
+    digest = hashlib.sha256()
+    with span("file_io"), open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    etag = '"' + digest.hexdigest() + '"'
+
+    with _etags_lock:
+        _etags[key] = etag
+        while len(_etags) > ETAG_CACHE_SIZE:
+            _etags.popitem(last=False)
+    return etag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def _stat(path: str):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def _select_variant(request: Request, original_path: str, size: Optional[int]):
+    """Pick the smallest rendered variant covering ``size``, in WebP if the client accepts it.
+
+    Falls back to the original file for uploads that predate variant rendering.
+    """
+    fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpg"
+    target = AVATAR_SIZES[-1]
+    if size:
+        target = next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+    path = variant_path(original_path, target, fmt)
+    stat_result = _stat(path)
+    if stat_result is not None:
+        return path, stat_result
+    return original_path, _stat(original_path)
+
+
+def picture_response(request: Request, file_path: Optional[str], size: Optional[int] = None) -> Response:
+    """Serve an avatar (or the default one) at ``size`` with ETag/Cache-Control and 304 support."""
+    stat_result = None
+    if file_path:
+        file_path, stat_result = _select_variant(request, file_path, size)
+
+    if stat_result is None:
+        headers = {"ETag": DEFAULT_PICTURE_ETAG, "Cache-Control": PICTURE_CACHE_CONTROL}
+        if etag_matches(request, DEFAULT_PICTURE_ETAG):
+            return Response(status_code=304, headers=headers)
+        return Response(content=DEFAULT_PICTURE, media_type="image/jpeg", headers=headers)
+
+    etag = file_etag(file_path, stat_result)
+    headers = {"ETag": etag, "Cache-Control": PICTURE_CACHE_CONTROL, "Vary": "Accept"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    ext = os.path.splitext(file_path)[1].lower()
+    media_type = CONTENT_TYPES.get(ext, "application/octet-stream")
+    return FileResponse(file_path, media_type=media_type, headers=headers, stat_result=stat_result)
@@ -0,0 +1,297 @@
+"""Opt-in request instrumentation, enabled with GELBAPP_PROFILING=1.
+
+For every request it records, per route template: wall time, the number and
+duration of SQL statements, and time spent in named spans (``bcrypt``,
+``jwt``, ``file_io``, ``image``). They are exported as Prometheus metrics at
+``/metrics`` (needs prometheus_client), together with the counters of caches
+registered with ``register_cache``. A SELECT repeated
+GELBAPP_N_PLUS_ONE_THRESHOLD times within one request is reported as a
+likely N+1.
+
+With GELBAPP_PROFILE_SECRET set, a request sending ``X-Profile: <secret>``
+gets a cProfile report of its endpoint as text/plain instead of its normal
+response (the original status is in ``X-Profiled-Status``).
+"""
+import cProfile
+import contextvars
+import functools
+import hmac
+import inspect
+import io
+import logging
+import os
+import pstats
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from fastapi import FastAPI # type: ignore
+from fastapi.responses import Response # type: ignore
+from fastapi.routing import APIRoute # type: ignore
+from sqlalchemy import event # type: ignore
+from sqlalchemy.engine import Engine # type: ignore
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.environ.get("GELBAPP_PROFILING", "0") == "1"
+PROFILE_SECRET = os.environ.get("GELBAPP_PROFILE_SECRET", "")
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("GELBAPP_N_PLUS_ONE_THRESHOLD", "10"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_REPORT_LINES = 40
+METRICS_PATH = "/metrics"
+
+
+class RequestStats:
+    def __init__(self, profile: bool = False):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.statements = Counter()
+        self.spans = Counter()
+        # cProfile runs of the endpoint, only collected when a report was requested
+        self.profiles: Optional[List[cProfile.Profile]] = [] if profile else None
+
+    def repeated_selects(self):
+        return [
+            (statement, count) for statement, count in self.statements.most_common()
+            if count >= N_PLUS_ONE_THRESHOLD and statement.lstrip()[:6].upper() == "SELECT"
+        ]
+
+
+_current = contextvars.ContextVar("gelbapp_request_stats", default=None)
+
+_caches: Dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], dict]):
+    """Export ``stats()`` (entries, hits, misses, evictions, invalidations) of an in-process cache."""
+    _caches[name] = stats
+
+
+@contextmanager
+def span(name: str):
+    """Add the time spent in the block to the current request's ``name`` span."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.spans[name] += time.perf_counter() - start
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("gelbapp_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    starts = conn.info.get("gelbapp_query_start")
+    if stats is None or not starts:
+        return
+    stats.sql_count += 1
+    stats.sql_seconds += time.perf_counter() - starts.pop()
+    stats.statements[statement] += 1
+
+
+def _profiled(endpoint):
+    """Wrap an endpoint so it runs under cProfile when its request asked for a report.
+
+    Sync endpoints are profiled in the threadpool thread that runs them, which
+    a profiler started in the middleware would not see.
+    """
+    if getattr(endpoint, "_gelbapp_profiled", False):
+        return endpoint
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            stats = _current.get()
+            if stats is None or stats.profiles is None:
+                return await endpoint(*args, **kwargs)
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profiler.disable()
+                stats.profiles.append(profiler)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            stats = _current.get()
+            if stats is None or stats.profiles is None:
+                return endpoint(*args, **kwargs)
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                profiler.disable()
+                stats.profiles.append(profiler)
+
+    wrapper._gelbapp_profiled = True
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose endpoint can be profiled per request; a plain APIRoute unless profiling is enabled."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if PROFILING_ENABLED:
+            endpoint = _profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class Metrics:
+    def __init__(self):
+        from prometheus_client import CollectorRegistry, Counter as PromCounter, Histogram # type: ignore
+
+        self.registry = CollectorRegistry()
+        self.request_seconds = Histogram(
+            "gelbapp_request_duration_seconds", "Wall time per request",
+            ["method", "route", "status"], registry=self.registry,
+        )
+        self.sql_statements = Histogram(
+            "gelbapp_request_sql_statements", "SQL statements executed per request",
+            ["route"], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000), registry=self.registry,
+        )
+        self.sql_seconds = Histogram(
+            "gelbapp_request_sql_seconds", "Time spent executing SQL per request",
+            ["route"], registry=self.registry,
+        )
+        self.span_seconds = Histogram(
+            "gelbapp_request_span_seconds", "Time spent in bcrypt, JWT decoding, file I/O and image rendering per request",
+            ["route", "span"], registry=self.registry,
+        )
+        self.n_plus_one = PromCounter(
+            "gelbapp_n_plus_one_total", "Requests that repeated one SELECT at least N_PLUS_ONE_THRESHOLD times",
+            ["route"], registry=self.registry,
+        )
+
+        self.registry.register(_CacheCollector())
+
+    def observe(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        self.request_seconds.labels(method, route, str(status)).observe(elapsed)
+        self.sql_statements.labels(route).observe(stats.sql_count)
+        self.sql_seconds.labels(route).observe(stats.sql_seconds)
+        for name, seconds in stats.spans.items():
+            self.span_seconds.labels(route, name).observe(seconds)
+
+        repeated = stats.repeated_selects()
+        if repeated:
+            self.n_plus_one.labels(route).inc()
+            statement, count = repeated[0]
+            logger.warning("Possible N+1 query", extra={
+                "method": method, "route": route, "count": count, "statement": " ".join(statement.split())[:200],
+            })
+
+    def render(self) -> Response:
+        from prometheus_client import CONTENT_TYPE_LATEST, generate_latest # type: ignore
+
+        return Response(generate_latest(self.registry), media_type=CONTENT_TYPE_LATEST)
+
+
+class _CacheCollector:
+    COUNTERS = ("hits", "misses", "evictions", "invalidations")
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily # type: ignore
+
+        entries = GaugeMetricFamily("gelbapp_cache_entries", "Entries held by an in-process cache", labels=["cache"])
+        counters = {
+            name: CounterMetricFamily(f"gelbapp_cache_{name}", f"Cache {name} of an in-process cache", labels=["cache"])
+            for name in self.COUNTERS
+        }
+        for cache, stats in _caches.items():
+            values = stats()
+            entries.add_metric([cache], values["entries"])
+            for name, family in counters.items():
+                family.add_metric([cache], values.get(name, 0))
+        yield entries
+        yield from counters.values()
+
+
+def _profile_requested(scope) -> bool:
+    if not PROFILE_SECRET:
+        return False
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return hmac.compare_digest(value, PROFILE_SECRET.encode("utf-8"))
+    return False
+
+
+def profile_report(route: str, status: int, elapsed: float, stats: RequestStats) -> str:
+    out = io.StringIO()
+    out.write(f"{route}  status {status}  wall {elapsed * 1000:.2f} ms\n")
+    out.write(f"SQL: {stats.sql_count} statements, {stats.sql_seconds * 1000:.2f} ms\n")
+    for name, seconds in sorted(stats.spans.items()):
+        out.write(f"{name}: {seconds * 1000:.2f} ms\n")
+    for statement, count in stats.statements.most_common(10):
+        out.write(f"  {count:>4}x {' '.join(statement.split())[:160]}\n")
+    out.write("\n")
+    if stats.profiles:
+        report = pstats.Stats(stats.profiles[0], stream=out)
+        for profiler in stats.profiles[1:]:
+            report.add(profiler)
+        report.sort_stats("cumulative").print_stats(PROFILE_REPORT_LINES)
+    else:
+        out.write("(no endpoint ran)\n")
+    return out.getvalue()
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI, so streamed responses are measured until their last chunk."""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == METRICS_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        profile = _profile_requested(scope)
+        stats = RequestStats(profile)
+        token = _current.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            if not profile:
+                await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.metrics.observe(scope["method"], route, status, elapsed, stats)
+
+        if profile:
+            report = Response(
+                profile_report(f"{scope['method']} {route}", status, elapsed, stats),
+                media_type="text/plain",
+                headers={"X-Profiled-Status": str(status)},
+            )
+            await report(scope, receive, send)
+
+
+def install(app: FastAPI):
+    """Add the middleware, SQL listeners and /metrics to ``app`` if GELBAPP_PROFILING=1."""
+    if not PROFILING_ENABLED:
+        return
+    metrics = Metrics()
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.add_middleware(InstrumentationMiddleware, metrics=metrics)
+    app.add_route(METRICS_PATH, lambda request: metrics.render(), include_in_schema=False)
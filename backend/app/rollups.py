@@ -0,0 +1,165 @@
+"""Hourly Gelbfeld rollups behind the activity statistics.
+
+``gelbfeld_rollups`` holds one row per (user, UTC hour) with Gelbfelder in
+it; guests are counted per (round, UTC hour) under ``guest_scope(round_id)``.
+The point write paths add to it inside their own transaction and only
+touch rows of the players who scored, so concurrent rounds never wait on
+each other. A user's activity reads O(hours with activity) rows in the
+requested range; the global series (GLOBAL_SCOPE) is summed per hour over
+every row in the range at read time. Neither scans ``gelbfelds``. Day,
+week and season totals and the "most active hours" histogram are grouped
+from those hourly totals.
+
+``rebuild_rollups`` recomputes the table from ``gelbfelds``, e.g. after a
+restore:
+
+    python -m app.rollups rebuild
+"""
+import datetime
+import sys
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import func, insert # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+
+from app.database import upsert_insert_for
+from app.models import Gelbfeld, GelbfeldRollup, RoundPlayer
+
+GLOBAL_SCOPE = 0
+REBUILD_BATCH_SIZE = 5000
+
+# Meteorological seasons; December counts towards the next year's winter
+_SEASONS = {12: "winter", 1: "winter", 2: "winter", 3: "spring", 4: "spring", 5: "spring",
+            6: "summer", 7: "summer", 8: "summer", 9: "autumn", 10: "autumn", 11: "autumn"}
+
+
+def hour_bucket(timestamp: datetime.datetime) -> datetime.datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def guest_scope(round_id: int) -> int:
+    """The rollup scope of a round's guests; negative, so it cannot clash with a user id."""
+    return -round_id
+
+
+def _count(events: Iterable[Tuple[Optional[int], int, datetime.datetime]]) -> Counter:
+    counts = Counter()
+    for user_id, round_id, timestamp in events:
+        scope = user_id if user_id is not None else guest_scope(round_id)
+        counts[(scope, hour_bucket(timestamp))] += 1
+    return counts
+
+
+def record_gelbfelder(db: Session, events: Iterable[Tuple[Optional[int], int, datetime.datetime]]):
+    """Add Gelbfelder scored as ``(user_id or None for guests, round_id, naive UTC timestamp)`` to the rollups."""
+    upsert_insert = upsert_insert_for(db)
+    # Sorted, so writers sharing a row (a user in two rounds, a batch) lock in the same order
+    for (user_id, bucket), count in sorted(_count(events).items()):
+        if upsert_insert is None:
+            row = db.query(GelbfeldRollup).filter_by(user_id=user_id, bucket_start=bucket).first()
+            if row is None:
+                db.add(GelbfeldRollup(user_id=user_id, bucket_start=bucket, gelbfelder=count))
+            else:
+                row.gelbfelder += count
+            continue
+
+        stmt = upsert_insert(GelbfeldRollup).values(user_id=user_id, bucket_start=bucket, gelbfelder=count)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[GelbfeldRollup.user_id, GelbfeldRollup.bucket_start],
+            set_={"gelbfelder": GelbfeldRollup.gelbfelder + count},
+        )
+        db.execute(stmt)
+
+
+def period_label(local: datetime.datetime, period: str) -> str:
+    if period == "day":
+        return local.date().isoformat()
+    if period == "week":
+        year, week, _ = local.isocalendar()
+        return f"{year}-W{week:02d}"
+    year = local.year + 1 if local.month == 12 else local.year
+    return f"{year}-{_SEASONS[local.month]}"
+
+
+def activity(
+    db: Session,
+    user_id: int,
+    period: str = "day",
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    utc_offset: int = 0,
+) -> dict:
+    """Gelbfelder per ``period`` and per hour of day for ``user_id`` (GLOBAL_SCOPE: everyone).
+
+    ``start``/``end`` are inclusive dates and, like the labels and hours, are
+    taken in the client's timezone, ``utc_offset`` whole hours from UTC.
+    """
+    offset = datetime.timedelta(hours=utc_offset)
+    if user_id == GLOBAL_SCOPE:
+        # Everyone's rows, summed per hour; read from the bucket_start index
+        query = db.query(GelbfeldRollup.bucket_start, func.sum(GelbfeldRollup.gelbfelder)).group_by(GelbfeldRollup.bucket_start)
+    else:
+        query = db.query(GelbfeldRollup.bucket_start, GelbfeldRollup.gelbfelder).filter(GelbfeldRollup.user_id == user_id)
+    if start is not None:
+        query = query.filter(GelbfeldRollup.bucket_start >= datetime.datetime.combine(start, datetime.time.min) - offset)
+    if end is not None:
+        end_exclusive = datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min)
+        query = query.filter(GelbfeldRollup.bucket_start < end_exclusive - offset)
+
+    # Buckets arrive in order, so the period totals keep chronological order
+    totals = {}
+    hours = [0] * 24
+    for bucket_start, gelbfelder in query.order_by(GelbfeldRollup.bucket_start):
+        local = bucket_start + offset
+        label = period_label(local, period)
+        totals[label] = totals.get(label, 0) + gelbfelder
+        hours[local.hour] += gelbfelder
+
+    return {
+        "period": period,
+        "utc_offset": utc_offset,
+        "start": start,
+        "end": end,
+        "total": sum(hours),
+        "buckets": [{"label": label, "gelbfelder": count} for label, count in totals.items()],
+        "hours": hours,
+    }
+
+
+def rebuild_rollups(db: Session) -> int:
+    """Recompute every rollup row from ``gelbfelds``. Returns the number of rows written."""
+    events = db.query(RoundPlayer.user_id, RoundPlayer.round_id, Gelbfeld.timestamp).join(
+        RoundPlayer, RoundPlayer.id == Gelbfeld.round_player_id
+    ).filter(Gelbfeld.timestamp.isnot(None)).execution_options(yield_per=REBUILD_BATCH_SIZE)
+    counts = _count(events)
+
+    db.query(GelbfeldRollup).delete(synchronize_session=False)
+    if counts:
+        db.execute(insert(GelbfeldRollup), [
+            {"user_id": user_id, "bucket_start": bucket, "gelbfelder": count}
+            for (user_id, bucket), count in counts.items()
+        ])
+    db.commit()
+    return len(counts)
+
+
+def main(argv=None):
+    from app.database import SessionLocal
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv != ["rebuild"]:
+        print("usage: python -m app.rollups rebuild", file=sys.stderr)
+        return 2
+
+    db = SessionLocal()
+    try:
+        count = rebuild_rollups(db)
+    finally:
+        db.close()
+    print(f"Rebuilt {count} Gelbfeld rollup rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
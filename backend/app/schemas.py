@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Dict, List, Optional
+import datetime
 
 class RegisterRequest(BaseModel):
     username: str
@@ -23,6 +24,8 @@ class AddFriendRequest(BaseModel):
 
 class SearchUsersRequest(TokenRequest):
     query: str
+    limit: int = Field(10, ge=1, le=50)
+    cursor: Optional[str] = None  # X-Next-Cursor of the previous page
     
 class PlayerInput(BaseModel):
     user_id: Optional[int] = None  # Wenn Freund
@@ -38,6 +41,117 @@ class AddPointInput(BaseModel):
     round_player_id: int
     token: str
 
+class PointEventInput(BaseModel):
+    round_player_id: int
+    timestamp: datetime.datetime  # When the tap happened on the device
+    idempotency_key: str
+
+class AddPointsBatchInput(BaseModel):
+    round_id: int
+    token: str
+    events: List[PointEventInput]
+
 class BetaTesterRequest(BaseModel):
     token: str
-    is_beta_tester: bool
\ No newline at end of file
+    is_beta_tester: bool
+
+# Response models. FastAPI validates handler results against them and then
+# serializes straight to JSON bytes; rows may be returned as they come from
+# the query (from_attributes reads SQLAlchemy Row attributes).
+
+class RowModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str
+
+class WhoAmIResponse(BaseModel):
+    username: str
+    email: str
+
+class Friend(RowModel):
+    id: int
+    username: str
+    email: str
+
+class FriendsResponse(BaseModel):
+    friends: List[Friend]
+
+class FriendStateEntry(RowModel):
+    friendship_id: int
+    id: int
+    username: str
+    email: str
+
+class IncomingRequest(RowModel):
+    request_id: int
+    from_user_id: int
+    username: str
+
+class OutgoingRequest(RowModel):
+    request_id: int
+    to_user_id: int
+    username: str
+
+class IncomingRequestsResponse(BaseModel):
+    incoming_requests: List[IncomingRequest]
+
+class OutgoingRequestsResponse(BaseModel):
+    outgoing_requests: List[OutgoingRequest]
+
+class FriendStateResponse(BaseModel):
+    version: int
+    friends: List[FriendStateEntry]
+    incoming_requests: List[IncomingRequest]
+    outgoing_requests: List[OutgoingRequest]
+    delta: bool
+    changed: List[int]  # friendship/request ids to drop before applying a delta
+
+class FriendEventsResponse(BaseModel):
+    events: List[Dict[str, Any]]
+    last_event_id: str
+    reset: bool
+
+class UserSearchResult(BaseModel):
+    username: str
+    email: str
+    status: str  # "none", "pending", "accepted" or "rejected"
+
+class MyStatisticsResponse(BaseModel):
+    username: str
+    total_rounds: int
+    total_points: int
+    total_gelbfelder: int
+    best_score_in_round: int
+
+class LeaderboardEntry(RowModel):
+    username: str
+    total_points: int
+    rounds_played: int
+    best_single_round: int
+
+class LeaderboardResponse(BaseModel):
+    leaderboard: List[LeaderboardEntry]
+
+class RoundHistoryEntry(BaseModel):
+    round_name: Optional[str] = None
+    points: int
+    date: Optional[datetime.datetime] = None
+
+class RoundHistoryPage(BaseModel):
+    rounds: List[RoundHistoryEntry]
+    next_cursor: Optional[str] = None
+
+class ActivityBucket(BaseModel):
+    label: str  # "2026-10-18", "2026-W42" or "2026-autumn"
+    gelbfelder: int
+
+class ActivityResponse(BaseModel):
+    period: str
+    utc_offset: int
+    start: Optional[datetime.date] = None
+    end: Optional[datetime.date] = None
+    total: int
+    buckets: List[ActivityBucket]
+    hours: List[int]  # Gelbfelder per hour of day, 0-23 in the client's timezone
@@ -0,0 +1,130 @@
+"""Read-through cache of serialized scoreboards for GET /rounds/{id}/scores.
+
+Every write that changes a scoreboard calls ``invalidate(round_id)`` after
+committing, which drops the cached payload and moves the round to a new
+version. A reader takes the round's version before querying and only stores
+its result if the version is unchanged, so a scoreboard read just before a
+commit can never be cached after that commit's invalidation.
+
+The cache is per process, like the round event streams, and another
+worker's writes never invalidate it. Entries therefore expire after
+GELBAPP_SCOREBOARD_CACHE_TTL seconds (default 1), which bounds how long a
+scoreboard can lag behind taps handled by other workers; 0 keeps entries
+until invalidated, which is only correct with a single worker. Hit, miss
+and eviction counters are exported at /metrics when profiling is enabled.
+"""
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from app.profiling import register_cache
+
+SCOREBOARD_CACHE_SIZE = int(os.environ.get("GELBAPP_SCOREBOARD_CACHE_SIZE", "1024"))
+# Seconds a cached scoreboard may be served; 0 keeps it until invalidated (single worker only)
+SCOREBOARD_CACHE_TTL = float(os.environ.get("GELBAPP_SCOREBOARD_CACHE_TTL", "1"))
+# Versions outlive cached payloads so in-flight reads of evicted rounds are still checked
+VERSION_TABLE_FACTOR = 4
+
+
+class CachedScoreboard(NamedTuple):
+    etag: str
+    body: bytes
+    expires: float
+
+
+class ScoreboardCache:
+    """Bounded LRU of round id -> serialized scoreboard, with per-round versions.
+
+    ETags are a hash of the serialized scoreboard, so they never name
+    different content, and every worker hands out the same ETag for the
+    same scoreboard.
+    """
+
+    def __init__(self, maxsize: int = SCOREBOARD_CACHE_SIZE, ttl: float = SCOREBOARD_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = OrderedDict()
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, round_id: int) -> Optional[CachedScoreboard]:
+        with self._lock:
+            entry = self._entries.get(round_id)
+            if entry is not None and self.ttl and entry.expires <= time.monotonic():
+                del self._entries[round_id]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(round_id)
+            self.hits += 1
+            return entry
+
+    def _touch_version(self, round_id: int, new: bool = False) -> int:
+        version = None if new else self._versions.get(round_id)
+        if version is None:
+            version = self._versions[round_id] = next(self._counter)
+        self._versions.move_to_end(round_id)
+        while len(self._versions) > self.maxsize * VERSION_TABLE_FACTOR:
+            self._versions.popitem(last=False)
+        return version
+
+    def version(self, round_id: int) -> int:
+        """Take before building a scoreboard; pass it to ``put``."""
+        with self._lock:
+            return self._touch_version(round_id)
+
+    def put(self, round_id: int, version: int, scoreboard: dict) -> CachedScoreboard:
+        """Serialize ``scoreboard`` and cache it unless the round changed since ``version`` was taken."""
+        body = json.dumps(scoreboard, default=str).encode("utf-8")
+        entry = CachedScoreboard(
+            etag=f'"scores-{round_id}-{hashlib.sha256(body).hexdigest()[:32]}"',
+            body=body,
+            expires=time.monotonic() + self.ttl,
+        )
+        with self._lock:
+            if self._versions.get(round_id) != version:
+                return entry
+            self._entries[round_id] = entry
+            self._entries.move_to_end(round_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, round_id: int):
+        with self._lock:
+            self._entries.pop(round_id, None)
+            self._touch_version(round_id, new=True)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+scoreboard_cache = ScoreboardCache()
+register_cache("scoreboard", scoreboard_cache.stats)
@@ -0,0 +1,184 @@
+"""User search for /search_users.
+
+Results come in two buckets so every page is an index range scan:
+
+1. usernames starting with the query, in username order, read from the
+   lower(username) expression index;
+2. other users whose username or email contains the query, in id order,
+   read from the SQLite FTS5 trigram index ``users_fts``.
+
+Cursors are opaque and encode the bucket plus the last key seen. The FTS
+table is kept in sync with ``users`` by triggers. Without FTS5 (other
+databases, or an SQLite build lacking the trigram tokenizer) bucket 2
+falls back to an ILIKE scan.
+"""
+import base64
+import json
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, func, not_, text # type: ignore
+from sqlalchemy.exc import OperationalError # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+
+from app.database import engine, is_sqlite, SQLALCHEMY_DATABASE_URL
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+# The trigram tokenizer cannot match anything shorter than this
+MIN_SUBSTRING_QUERY = 3
+PREFIX_UPPER_BOUND = "\U0010ffff"
+# Largest id SQLite (and a PostgreSQL bigint) can hold
+MAX_USER_ID = 2 ** 63 - 1
+
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        username, email, content='users', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, email) VALUES (new.id, new.username, new.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, email) VALUES ('delete', old.id, old.username, old.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username, email ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, email) VALUES ('delete', old.id, old.username, old.email);
+        INSERT INTO users_fts(rowid, username, email) VALUES (new.id, new.username, new.email);
+    END""",
+]
+
+fts_enabled = False
+
+
+def create_search_index():
+    """Create the FTS5 table and triggers if missing, backfilling it on first creation."""
+    global fts_enabled
+    if not is_sqlite(SQLALCHEMY_DATABASE_URL):
+        return
+    try:
+        with engine.begin() as connection:
+            existed = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+            ).first() is not None
+            for statement in FTS_DDL:
+                connection.execute(text(statement))
+            if not existed:
+                connection.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+    except OperationalError as e:
+        logger.warning("User search index unavailable, falling back to ILIKE", extra={"error": str(e)})
+        return
+    fts_enabled = True
+
+
+class SearchHit(NamedTuple):
+    id: int
+    username: str
+    email: str
+
+
+def encode_cursor(bucket: int, key) -> str:
+    raw = json.dumps([bucket, key]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, object]:
+    """``(0, last lower(username))`` in the prefix bucket, ``(1, last user id or None)`` in the substring one."""
+    try:
+        bucket, key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    # bool is an int subclass, hence the exact type checks
+    if type(bucket) is not int:
+        raise ValueError("Invalid cursor")
+    if bucket == 0 and type(key) is str:
+        return bucket, key
+    if bucket == 1 and (key is None or (type(key) is int and 0 <= key <= MAX_USER_ID)):
+        return bucket, key
+    raise ValueError("Invalid cursor")
+
+
+def _fts_phrase(query: str) -> str:
+    return '"' + query.replace('"', '""') + '"'
+
+
+def search_users(
+    db: Session, query: str, exclude_user_id: int, limit: int, cursor: Optional[str] = None
+) -> Tuple[List[SearchHit], Optional[str]]:
+    """Return up to ``limit`` hits and the cursor of the next page (None when exhausted)."""
+    needle = query.strip().lower()
+    if not needle:
+        return [], None
+
+    bucket, after = decode_cursor(cursor) if cursor else (0, None)
+    upper = needle + PREFIX_UPPER_BOUND
+    hits: List[SearchHit] = []
+
+    if bucket == 0:
+        username_lower = func.lower(User.username)
+        prefix = db.query(User.id, User.username, User.email).filter(
+            username_lower >= needle,
+            username_lower < upper,
+            User.id != exclude_user_id,
+        )
+        if after is not None:
+            prefix = prefix.filter(username_lower > after)
+        # The expression index is unique, so lower(username) alone is a total order
+        rows = prefix.order_by(username_lower).limit(limit + 1).all()
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            return [SearchHit(*r) for r in rows[:limit]], encode_cursor(0, last.username.lower())
+        hits.extend(SearchHit(*r) for r in rows)
+        bucket, after = 1, None
+
+    if len(needle) < MIN_SUBSTRING_QUERY:
+        return hits, None
+
+    remaining = limit - len(hits)
+    if remaining <= 0:
+        return hits, encode_cursor(1, None)
+
+    rows = _substring_matches(db, needle, upper, exclude_user_id, after, remaining + 1)
+    if len(rows) > remaining:
+        rows = rows[:remaining]
+        hits.extend(SearchHit(*r) for r in rows)
+        return hits, encode_cursor(1, rows[-1][0])
+    hits.extend(SearchHit(*r) for r in rows)
+    return hits, None
+
+
+FTS_PAGE_SQL = text("""
+    SELECT users.id, users.username, users.email
+    FROM users_fts JOIN users ON users.id = users_fts.rowid
+    WHERE users_fts MATCH :phrase
+      AND users_fts.rowid > :after_id
+      AND users.id != :exclude_user_id
+      AND NOT (lower(users.username) >= :needle AND lower(users.username) < :upper)
+    ORDER BY users_fts.rowid
+    LIMIT :limit
+""")
+
+
+def _substring_matches(db: Session, needle: str, upper: str, exclude_user_id: int, after_id, limit: int):
+    """Users containing ``needle`` that are not already in the prefix bucket, in id order."""
+    if fts_enabled:
+        # FTS5 yields matches in rowid order, so the LIMIT stops the scan early
+        return db.execute(FTS_PAGE_SQL, {
+            "phrase": _fts_phrase(needle),
+            "after_id": after_id if after_id is not None else 0,
+            "exclude_user_id": exclude_user_id,
+            "needle": needle,
+            "upper": upper,
+            "limit": limit,
+        }).all()
+
+    username_lower = func.lower(User.username)
+    pattern = f"%{needle}%"
+    matches = db.query(User.id, User.username, User.email).filter(
+        User.username.ilike(pattern) | User.email.ilike(pattern),
+        User.id != exclude_user_id,
+        not_(and_(username_lower >= needle, username_lower < upper)),
+    )
+    if after_id is not None:
+        matches = matches.filter(User.id > after_id)
+    return matches.order_by(User.id).limit(limit).all()
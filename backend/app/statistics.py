@@ -0,0 +1,130 @@
+"""Maintenance of the materialized per-user aggregates in ``user_statistics``.
+
+The write paths (round creation, point scoring) keep the rows current inside
+their own transaction; ``rebuild_user_statistics`` recomputes every row from
+``round_players``/``gelbfelds`` in bulk, e.g. after a restore or for databases
+created before the table was maintained:
+
+    python -m app.statistics rebuild
+"""
+import sys
+from collections import Counter
+
+from sqlalchemy import case, func, select, insert # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+
+from app.database import upsert_insert_for
+from app.models import RoundPlayer, Gelbfeld, UserStatistics
+
+
+def get_or_create_statistics(db: Session, user_id: int) -> UserStatistics:
+    stats = db.query(UserStatistics).filter_by(user_id=user_id).first()
+    if not stats:
+        stats = UserStatistics(
+            user_id=user_id,
+            total_rounds=0,
+            total_points=0,
+            total_gelbfelder=0,
+            best_score_in_round=0,
+        )
+        db.add(stats)
+    return stats
+
+
+def record_round_joined(db: Session, user_ids):
+    """Count a new round for every registered player (guests have no stats)."""
+    # The session does not autoflush, so merge duplicates before the lookups
+    for user_id, count in Counter(u for u in user_ids if u is not None).items():
+        stats = get_or_create_statistics(db, user_id)
+        stats.total_rounds = (stats.total_rounds or 0) + count
+
+
+def record_point(db: Session, user_id: int, round_points: int, count: int = 1):
+    """Account ``count`` Gelbfelder for ``user_id`` whose round score is now ``round_points``.
+
+    Issued as a single INSERT ... ON CONFLICT DO UPDATE so concurrent points
+    for the same user add up instead of overwriting each other.
+    """
+    upsert_insert = upsert_insert_for(db)
+    if upsert_insert is None:
+        stats = get_or_create_statistics(db, user_id)
+        stats.total_points = (stats.total_points or 0) + count
+        stats.total_gelbfelder = (stats.total_gelbfelder or 0) + count
+        if stats.best_score_in_round is None or round_points > stats.best_score_in_round:
+            stats.best_score_in_round = round_points
+        return
+
+    best = func.coalesce(UserStatistics.best_score_in_round, 0)
+    stmt = upsert_insert(UserStatistics).values(
+        user_id=user_id,
+        total_rounds=0,
+        total_points=count,
+        total_gelbfelder=count,
+        best_score_in_round=round_points,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserStatistics.user_id],
+        set_={
+            "total_points": func.coalesce(UserStatistics.total_points, 0) + count,
+            "total_gelbfelder": func.coalesce(UserStatistics.total_gelbfelder, 0) + count,
+            "best_score_in_round": case((best < round_points, round_points), else_=best),
+        },
+    )
+    db.execute(stmt)
+
+
+def rebuild_user_statistics(db: Session) -> int:
+    """Recompute all rows from the raw round data. Returns the number of rows written."""
+    gelbfelder = (
+        select(
+            RoundPlayer.user_id.label("user_id"),
+            func.count(Gelbfeld.id).label("total_gelbfelder"),
+        )
+        .join(Gelbfeld, Gelbfeld.round_player_id == RoundPlayer.id)
+        .where(RoundPlayer.user_id.isnot(None))
+        .group_by(RoundPlayer.user_id)
+        .subquery()
+    )
+    aggregates = (
+        select(
+            RoundPlayer.user_id,
+            func.count(RoundPlayer.id),
+            func.coalesce(func.sum(RoundPlayer.points), 0),
+            func.coalesce(gelbfelder.c.total_gelbfelder, 0),
+            func.coalesce(func.max(RoundPlayer.points), 0),
+        )
+        .outerjoin(gelbfelder, gelbfelder.c.user_id == RoundPlayer.user_id)
+        .where(RoundPlayer.user_id.isnot(None))
+        .group_by(RoundPlayer.user_id)
+    )
+
+    db.query(UserStatistics).delete(synchronize_session=False)
+    result = db.execute(
+        insert(UserStatistics).from_select(
+            ["user_id", "total_rounds", "total_points", "total_gelbfelder", "best_score_in_round"],
+            aggregates,
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def main(argv=None):
+    from app.database import SessionLocal
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv != ["rebuild"]:
+        print("usage: python -m app.statistics rebuild", file=sys.stderr)
+        return 2
+
+    db = SessionLocal()
+    try:
+        count = rebuild_user_statistics(db)
+    finally:
+        db.close()
+    print(f"Rebuilt statistics for {count} users")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,25 @@
+import asyncio
 import bcrypt
-from jose import JWTError, jwt # type: ignore
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from jose import jwt # type: ignore
 from datetime import datetime, timedelta
+from app.profiling import span
 
 SECRET_KEY = "Testing"  # ⚠️ Replace with a secure value in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 187  # token is valid for 30 minutes
 
+# bcrypt cost factor; existing hashes are upgraded on the next successful login
+BCRYPT_ROUNDS = int(os.environ.get("GELBAPP_BCRYPT_ROUNDS", "12"))
+# Password hashing runs in its own processes and is awaited from the event loop,
+# so it never holds a thread of the route threadpool
+PASSWORD_WORKERS = int(os.environ.get("GELBAPP_PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_QUEUE_LIMIT = int(os.environ.get("GELBAPP_PASSWORD_QUEUE_LIMIT", str(PASSWORD_WORKERS * 8)))
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -13,21 +27,84 @@ def create_access_token(data: dict):
     token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
-def whoami(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("email")  # <- use "email" instead of "sub"
-        if email is None:
-            raise JWTError("Invalid token")
-        return email
-    except JWTError:
-        return None
-    
-def hash_password(password: str) -> str:
-    salt = bcrypt.gensalt()
+class PasswordPoolSaturated(Exception):
+    """More password operations are queued than PASSWORD_QUEUE_LIMIT allows."""
+
+def _hashpw(password: str, rounds: int) -> str:
+    salt = bcrypt.gensalt(rounds=rounds)
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed_password.decode('utf-8')
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+class PasswordHasher:
+    """A bounded process pool for bcrypt work.
+
+    Callers await their job without occupying a thread, but at most
+    ``queue_limit`` jobs may be running or waiting; beyond that
+    PasswordPoolSaturated is raised immediately instead of queueing more.
+    """
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, queue_limit: int = PASSWORD_QUEUE_LIMIT):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # forkserver/spawn: forking the threaded server would copy locks held by other threads
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, pool: ProcessPoolExecutor, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolSaturated()
+        try:
+            future = pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def run(self, fn, *args):
+        pool = self._get_pool()
+        with span("bcrypt"):
+            try:
+                return await asyncio.wrap_future(self._submit(pool, fn, *args))
+            except BrokenProcessPool:
+                # A dead worker breaks the whole pool; replace it and retry once
+                self._discard_pool(pool)
+                return await asyncio.wrap_future(self._submit(self._get_pool(), fn, *args))
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+password_hasher = PasswordHasher()
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(_hashpw, password, BCRYPT_ROUNDS)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(_checkpw, plain_password, hashed_password)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$<cost>$<salt+hash>
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
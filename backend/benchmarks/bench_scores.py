@@ -0,0 +1,107 @@
+"""Benchmark GET /rounds/{round_id}/scores on a synthetic long round.
+
+Seeds a throwaway SQLite database with one round of --players players and
+--points Gelbfelder, then times build_scoreboard() against the previous
+implementation (load every Gelbfeld to len() it, lazy-load players/users).
+
+    cd backend && python benchmarks/bench_scores.py --points 10000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_scoreboard(db, round_id):
+    from app.models import Round, Gelbfeld
+
+    gelbfields = len(db.query(Gelbfeld).filter_by(round_id=round_id).all())
+    round = db.query(Round).filter_by(id=round_id).first()
+    scores = []
+    for p in round.players:
+        if p.user:
+            scores.append({"name": p.user.username, "points": p.points, "player_id": p.id, "is_guest": False})
+        else:
+            scores.append({"name": p.guest_name, "points": p.points, "player_id": p.id, "is_guest": True})
+    return {"round_id": round_id, "field_count": gelbfields, "round_name": round.name,
+            "player_count": len(round.players), "scores": scores}
+
+
+def seed(db, players: int, points: int) -> int:
+    from app.models import User, Round, RoundPlayer, Gelbfeld
+
+    users = [User(username=f"bench{i}", email=f"bench{i}@example.com", password="x") for i in range(players)]
+    db.add_all(users)
+    db.flush()
+    round = Round(name="bench", creator_id=users[0].id)
+    db.add(round)
+    db.flush()
+    round_players = [RoundPlayer(round_id=round.id, user_id=u.id, points=0) for u in users]
+    db.add_all(round_players)
+    db.flush()
+    rows = []
+    for i in range(points):
+        player = round_players[i % players]
+        player.points += 1
+        rows.append({"round_id": round.id, "round_player_id": player.id})
+    db.bulk_insert_mappings(Gelbfeld, rows)
+    db.commit()
+    return round.id
+
+
+def measure(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=10_000)
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gelbapp-bench-")
+    os.environ["GELBAPP_DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+
+    from app.database import Base, engine, SessionLocal
+    from app.apis import build_scoreboard
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    round_id = seed(db, args.players, args.points)
+    assert build_scoreboard(db, round_id) == legacy_scoreboard(db, round_id)
+
+    def fresh(fn):
+        def run():
+            session = SessionLocal()
+            try:
+                fn(session, round_id)
+            finally:
+                session.close()
+        return run
+
+    results = {
+        "legacy": measure(fresh(legacy_scoreboard), args.repeat),
+        "build_scoreboard": measure(fresh(build_scoreboard), args.repeat),
+    }
+    print(f"round with {args.points} Gelbfelder, {args.players} players, {args.repeat} runs")
+    for name, result in results.items():
+        print(f"  {name:<18} median {result['median_ms']:>9.3f} ms   p95 {result['p95_ms']:>9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark /search_users on a large synthetic user table.
+
+Seeds a throwaway SQLite database with --users users (1M by default), builds
+the FTS5 search index, then times app.search.search_users() against the
+previous implementation (ILIKE '%q%' on username and email, LIMIT 10) for
+queries of different lengths and selectivity.
+
+    cd backend && python benchmarks/bench_search.py --users 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED_BATCH = 50_000
+DOMAINS = ["example.com", "mail.de", "gelb.app", "posteo.net"]
+
+
+def legacy_search(db, query: str, exclude_user_id: int):
+    from app.models import User
+
+    return db.query(User.id, User.username, User.email).filter(
+        ((User.username.ilike(f"%{query}%")) | (User.email.ilike(f"%{query}%"))) &
+        (User.id != exclude_user_id)
+    ).limit(10).all()
+
+
+def seed(engine, users: int):
+    rng = random.Random(42)
+    letters = string.ascii_lowercase
+    with engine.begin() as connection:
+        raw = connection.connection.driver_connection
+        for start in range(0, users, SEED_BATCH):
+            rows = []
+            for i in range(start, min(start + SEED_BATCH, users)):
+                name = "".join(rng.choices(letters, k=rng.randint(4, 9))) + str(i)
+                rows.append((name, f"{name}@{DOMAINS[i % len(DOMAINS)]}", "x"))
+            raw.executemany("INSERT INTO users (username, email, password) VALUES (?, ?, ?)", rows)
+
+
+def measure(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--queries", nargs="+", default=["a", "ab", "abc", "xqz", "123", "99999", "gelb.app"])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gelbapp-bench-")
+    os.environ["GELBAPP_DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+
+    from app.database import Base, engine, SessionLocal
+    from app import search
+
+    Base.metadata.create_all(bind=engine)
+    start = time.perf_counter()
+    seed(engine, args.users)
+    seeded = time.perf_counter()
+    # Created after seeding so the backfill runs once instead of per-row triggers
+    search.create_search_index()
+    indexed = time.perf_counter()
+    print(f"{args.users} users: seeded in {seeded - start:.1f} s, "
+          f"search index built in {indexed - seeded:.1f} s (fts5: {search.fts_enabled})")
+
+    def fresh(fn, query):
+        def run():
+            session = SessionLocal()
+            try:
+                fn(session, query)
+            finally:
+                session.close()
+        return run
+
+    def new_search(db, query):
+        return search.search_users(db, query, exclude_user_id=1, limit=10)
+
+    def old_search(db, query):
+        return legacy_search(db, query, exclude_user_id=1)
+
+    print(f"{args.repeat} runs per query, first page of 10")
+    for query in args.queries:
+        legacy = measure(fresh(old_search, query), args.repeat)
+        current = measure(fresh(new_search, query), args.repeat)
+        print(f"  {query!r:<12} legacy median {legacy['median_ms']:>9.3f} ms  p95 {legacy['p95_ms']:>9.3f} ms   "
+              f"search_users median {current['median_ms']:>9.3f} ms  p95 {current['p95_ms']:>9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
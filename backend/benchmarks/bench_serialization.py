@@ -0,0 +1,215 @@
+"""Benchmark JSON serialization of the list-heavy endpoints.
+
+For each payload shape (leaderboard, my_round_history, search_users,
+friends/state) a handler returning prepared data is mounted three ways and
+called in-process through ASGI, so only routing and serialization are timed:
+
+    dict         ad-hoc dicts, no response model (jsonable_encoder + json.dumps)
+    orjson       the same dicts with ORJSONResponse as default response class
+    model        what the handlers return now, with their response model
+
+A fourth app returns a pre-rendered Response as the framework floor. Rows are
+real SQLAlchemy Rows from an in-memory SQLite query.
+
+    cd backend && python benchmarks/bench_serialization.py --rows 200
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+import warnings
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def query_rows(columns, values):
+    from sqlalchemy import create_engine, text # type: ignore
+
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text(f"CREATE TABLE t ({', '.join(columns)})"))
+        connection.execute(
+            text(f"INSERT INTO t VALUES ({', '.join(':' + c for c in columns)})"),
+            [dict(zip(columns, row)) for row in values],
+        )
+        return connection.execute(text(f"SELECT {', '.join(columns)} FROM t")).all()
+
+
+def payloads(rows: int):
+    """name -> (response model, legacy handler result builder, current handler result builder)."""
+    from app import schemas
+
+    now = datetime.datetime(2026, 5, 1, 12, 0, 0, 123456)
+
+    leaders = query_rows(
+        ["username", "total_points", "rounds_played", "best_single_round"],
+        [(f"user{i}", 1000 - i, 50, 40) for i in range(10)],
+    )
+    history = [
+        {"round_name": f"round {i}", "points": i % 17, "date": now - datetime.timedelta(hours=i)}
+        for i in range(rows)
+    ]
+    hits = [{"username": f"user{i}", "email": f"user{i}@example.com", "status": "none"} for i in range(50)]
+    friends = query_rows(
+        ["friendship_id", "id", "username", "email"],
+        [(i, i + 1, f"user{i}", f"user{i}@example.com") for i in range(rows)],
+    )
+    incoming = query_rows(
+        ["request_id", "from_user_id", "username"], [(i, i + 1, f"user{i}") for i in range(rows // 4)]
+    )
+
+    def legacy_state():
+        return {
+            "version": 7,
+            "friends": [
+                {"friendship_id": f.friendship_id, "id": f.id, "username": f.username, "email": f.email}
+                for f in friends
+            ],
+            "incoming_requests": [
+                {"request_id": r.request_id, "from_user_id": r.from_user_id, "username": r.username}
+                for r in incoming
+            ],
+            "outgoing_requests": [],
+            "delta": False,
+            "changed": [],
+        }
+
+    return {
+        "leaderboard": (
+            schemas.LeaderboardResponse,
+            lambda: {"leaderboard": [
+                {"username": p.username, "total_points": p.total_points,
+                 "rounds_played": p.rounds_played, "best_single_round": p.best_single_round}
+                for p in leaders
+            ]},
+            lambda: {"leaderboard": leaders},
+        ),
+        "my_round_history": (
+            schemas.RoundHistoryPage,
+            lambda: {"rounds": history, "next_cursor": None},
+            lambda: {"rounds": history, "next_cursor": None},
+        ),
+        "search_users": (
+            List[schemas.UserSearchResult],
+            lambda: hits,
+            lambda: hits,
+        ),
+        "friends_state": (
+            schemas.FriendStateResponse,
+            legacy_state,
+            lambda: {
+                "version": 7, "friends": friends, "incoming_requests": incoming,
+                "outgoing_requests": [], "delta": False, "changed": [],
+            },
+        ),
+    }
+
+
+def build_app(variant: str, model, build):
+    from fastapi import FastAPI # type: ignore
+    from fastapi.responses import Response # type: ignore
+
+    if variant == "orjson":
+        from fastapi.responses import ORJSONResponse # type: ignore
+
+        app = FastAPI(default_response_class=ORJSONResponse)
+    else:
+        app = FastAPI()
+
+    if variant == "floor":
+        from fastapi.encoders import jsonable_encoder # type: ignore
+
+        body = json.dumps(jsonable_encoder(build())).encode("utf-8")
+
+        @app.get("/bench")
+        async def floor():
+            return Response(body, media_type="application/json")
+    elif variant == "model":
+        @app.get("/bench", response_model=model)
+        async def with_model():
+            return build()
+    else:
+        @app.get("/bench")
+        async def plain():
+            return build()
+    return app
+
+
+async def call(app) -> bytes:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/bench", "raw_path": b"/bench", "root_path": "", "query_string": b"",
+        "headers": [], "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def measure(app, repeat: int):
+    await call(app)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call(app)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+    }
+
+
+async def run(rows: int, repeat: int):
+    try:
+        import orjson # type: ignore # noqa: F401
+        variants = ["floor", "dict", "orjson", "model"]
+    except ImportError:
+        variants = ["floor", "dict", "model"]
+        print("orjson is not installed, skipping the orjson variant")
+
+    print(f"{rows} rows per list, {repeat} requests per variant")
+    for name, (model, legacy, current) in payloads(rows).items():
+        apps = {
+            variant: build_app(variant, model, current if variant == "model" else legacy)
+            for variant in variants
+        }
+        expected = json.loads(await call(apps["dict"]))
+        for variant, app in apps.items():
+            assert json.loads(await call(app)) == expected, f"{name}: {variant} differs"
+
+        results = {variant: await measure(app, repeat) for variant, app in apps.items()}
+        floor = results["floor"]["median_ms"]
+        print(f"  {name}")
+        for variant, result in results.items():
+            extra = "" if variant == "floor" else f"   serialization ~{result['median_ms'] - floor:>7.3f} ms"
+            print(f"    {variant:<8} median {result['median_ms']:>8.3f} ms   p95 {result['p95_ms']:>8.3f} ms{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    # ORJSONResponse is deprecated in newer FastAPI releases; it is measured anyway
+    warnings.simplefilter("ignore", DeprecationWarning)
+    asyncio.run(run(args.rows, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
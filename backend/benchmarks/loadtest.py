@@ -0,0 +1,389 @@
+"""Load test the backend against a local uvicorn and a seeded SQLite database.
+
+Every scenario runs for --duration seconds with --concurrency workers and
+reports throughput and p50/p95/p99 latency as JSON:
+
+    register_login  POST /register then POST /login (bcrypt bound)
+    friends         POST /friends
+    points_burst    POST /points/add, every worker tapping the same active round
+    scores_poll     GET /rounds/{id}/scores on the active rounds
+    leaderboard     GET /statistics/leaderboard
+
+    cd backend
+    python benchmarks/loadtest.py run --output report.json
+    python benchmarks/loadtest.py run --base-url http://127.0.0.1:8000 --manifest /tmp/load.db.json
+    python benchmarks/loadtest.py compare main HEAD     # seeds once, runs both revisions
+    python benchmarks/loadtest.py diff old.json new.json
+
+``compare`` checks the revisions out into temporary git worktrees (omit the
+second one to use the working tree) and exits with status 1 when a scenario's
+throughput drops or its p95 latency grows by more than --threshold percent.
+Needs httpx on top of requirements.txt.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx # type: ignore
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from seed_data import seed  # noqa: E402
+
+TOKEN_USERS = 20
+SERVER_START_TIMEOUT = 120
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            # Some endpoints report failures as 200 {"error": ...}
+            ok = response.status_code < 400 and not response.text.startswith('{"error"')
+        except httpx.HTTPError:
+            response, ok = None, False
+        elapsed = (time.perf_counter() - start) * 1000
+        if ok:
+            self.latencies.setdefault(name, []).append(elapsed)
+        else:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response if ok else None
+
+    def summary(self, elapsed: float) -> dict:
+        result = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            timings = sorted(self.latencies.get(name, []))
+            result[name] = {
+                "requests": len(timings),
+                "errors": self.errors.get(name, 0),
+                "rps": round(len(timings) / elapsed, 2),
+                "p50_ms": round(percentile(timings, 0.50), 3),
+                "p95_ms": round(percentile(timings, 0.95), 3),
+                "p99_ms": round(percentile(timings, 0.99), 3),
+                "max_ms": round(timings[-1], 3) if timings else 0.0,
+            }
+        return result
+
+
+async def register_login(client, recorder, context, rng):
+    name = f"lt{uuid.uuid4().hex[:12]}"
+    password = context["manifest"]["password"]
+    await recorder.request(client, "register", "POST", "/register",
+                           json={"username": name, "email": f"{name}@example.com", "password": password})
+    await recorder.request(client, "login", "POST", "/login",
+                           json={"username_or_email": name, "password": password})
+
+
+async def friends(client, recorder, context, rng):
+    await recorder.request(client, "friends", "POST", "/friends", json={"token": rng.choice(context["tokens"])})
+
+
+async def points_burst(client, recorder, context, rng):
+    hot = context["manifest"]["active_rounds"][-1]
+    await recorder.request(client, "points_add", "POST", "/points/add", json={
+        "round_id": hot["round_id"],
+        "round_player_id": rng.choice(hot["player_ids"]),
+        "token": rng.choice(context["tokens"]),
+    })
+
+
+async def scores_poll(client, recorder, context, rng):
+    active = rng.choice(context["manifest"]["active_rounds"])
+    await recorder.request(client, "scores", "GET", f"/rounds/{active['round_id']}/scores")
+
+
+async def leaderboard(client, recorder, context, rng):
+    await recorder.request(client, "leaderboard", "GET", "/statistics/leaderboard")
+
+
+SCENARIOS = {
+    "register_login": register_login,
+    "friends": friends,
+    "points_burst": points_burst,
+    "scores_poll": scores_poll,
+    "leaderboard": leaderboard,
+}
+
+
+async def login_tokens(client: httpx.AsyncClient, manifest: dict) -> list:
+    tokens = []
+    for user_id in range(1, min(TOKEN_USERS, manifest["users"]) + 1):
+        response = await client.post("/login", json={"username_or_email": f"load{user_id}", "password": manifest["password"]})
+        response.raise_for_status()
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+
+async def run_scenario(base_url: str, scenario, context: dict, duration: float, concurrency: int, seed_value: int) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker(index: int):
+            rng = random.Random(seed_value * 1000 + index)
+            while time.perf_counter() < deadline:
+                await scenario(client, recorder, context, rng)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return recorder.summary(elapsed)
+
+
+async def run_suite(base_url: str, manifest: dict, scenarios, duration: float, concurrency: int, seed_value: int) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        context = {"manifest": manifest, "tokens": await login_tokens(client, manifest)}
+    results = {}
+    for name in scenarios:
+        print(f"  {name} ({duration:g} s, {concurrency} workers)", file=sys.stderr)
+        results.update(await run_scenario(base_url, SCENARIOS[name], context, duration, concurrency, seed_value))
+    return results
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalServer:
+    """uvicorn serving ``backend_dir`` on a private copy of the seeded database.
+
+    The server runs in a scratch directory holding ``gelbapp.db`` because
+    older revisions hard-code ``sqlite:///./gelbapp.db``.
+    """
+
+    def __init__(self, backend_dir: str, database: str, workers: int = 1):
+        self.backend_dir = backend_dir
+        self.database = database
+        self.workers = workers
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.process = None
+        self.workdir = None
+
+    def __enter__(self):
+        self.workdir = tempfile.mkdtemp(prefix="gelbapp-load-run-")
+        shutil.copy(self.database, os.path.join(self.workdir, "gelbapp.db"))
+        env = dict(os.environ, GELBAPP_DATABASE_URL="sqlite:///./gelbapp.db")
+        self.log = open(os.path.join(self.workdir, "server.log"), "wb")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", self.backend_dir,
+             "--port", str(self.port), "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=self.workdir, env=env, stdout=self.log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.time() + SERVER_START_TIMEOUT
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {self.process.returncode}, see {self.log.name}")
+            try:
+                if httpx.get(self.base_url + "/statistics/leaderboard", timeout=2).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"uvicorn did not start within {SERVER_START_TIMEOUT} s")
+
+    def __exit__(self, *exc):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.log.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def describe_revision(backend_dir: str) -> str:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=backend_dir,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def build_report(revision: str, manifest: dict, args, results: dict) -> dict:
+    return {
+        "meta": {
+            "revision": revision,
+            "started_at": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "dataset": {k: manifest[k] for k in ("users", "rounds", "gelbfelder", "friendships", "seed")},
+        },
+        "results": results,
+    }
+
+
+def prepare_dataset(args) -> tuple:
+    if args.database:
+        with open(args.database + ".json") as f:
+            return args.database, json.load(f)
+    path = os.path.join(tempfile.mkdtemp(prefix="gelbapp-load-"), "seed.db")
+    print(f"seeding {path}", file=sys.stderr)
+    manifest = seed(path, args.users, args.rounds, args.gelbfelder, seed_value=args.seed)
+    return path, manifest
+
+
+def run_against(backend_dir: str, database: str, manifest: dict, args) -> dict:
+    with LocalServer(backend_dir, database, args.server_workers) as server:
+        results = asyncio.run(run_suite(server.base_url, manifest, args.scenarios,
+                                        args.duration, args.concurrency, args.seed))
+    return build_report(describe_revision(backend_dir), manifest, args, results)
+
+
+def compare_reports(old: dict, new: dict, threshold: float) -> list:
+    """Print a comparison table and return the regressions found."""
+    regressions = []
+    print(f"{'endpoint':<14} {'rps':>21} {'p50 ms':>21} {'p95 ms':>21} {'p99 ms':>21}")
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        before, after = old["results"].get(name), new["results"].get(name)
+        if not before or not after:
+            print(f"{name:<14} only in {'new' if after else 'old'} report")
+            continue
+        cells = []
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            cells.append(f"{before[metric]:>9.2f} -> {after[metric]:>9.2f}")
+        flags = []
+        if before["rps"] and after["rps"] < before["rps"] * (1 - threshold / 100):
+            flags.append("throughput")
+        if before["p95_ms"] and after["p95_ms"] > before["p95_ms"] * (1 + threshold / 100):
+            flags.append("p95")
+        if after["errors"] > before["errors"]:
+            flags.append("errors")
+        if flags:
+            regressions.append((name, flags))
+        print(f"{name:<14} " + " ".join(cells) + (f"   REGRESSION: {', '.join(flags)}" if flags else ""))
+    return regressions
+
+
+def checkout(revision: str) -> str:
+    repo = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=BACKEND_DIR,
+                          capture_output=True, text=True, check=True).stdout.strip()
+    worktree = tempfile.mkdtemp(prefix="gelbapp-load-rev-")
+    subprocess.run(["git", "worktree", "add", "--detach", "--force", worktree, revision],
+                   cwd=repo, check=True, capture_output=True)
+    return worktree
+
+
+def remove_checkout(worktree: str):
+    subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=BACKEND_DIR, capture_output=True)
+    shutil.rmtree(worktree, ignore_errors=True)
+
+
+def add_common_arguments(parser):
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--database", help="an existing seed_data.py database (its .json manifest must exist)")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=2_000)
+    parser.add_argument("--gelbfelder", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite against this checkout or --base-url")
+    add_common_arguments(run)
+    run.add_argument("--base-url", help="use an already running server instead of starting one")
+    run.add_argument("--manifest", help="manifest of the database the --base-url server uses")
+    run.add_argument("--output", help="write the JSON report here instead of stdout")
+
+    compare = commands.add_parser("compare", help="run the suite on two git revisions and flag regressions")
+    add_common_arguments(compare)
+    compare.add_argument("baseline")
+    compare.add_argument("candidate", nargs="?", help="defaults to the working tree")
+    compare.add_argument("--threshold", type=float, default=10.0, help="percent")
+    compare.add_argument("--output-dir", default=".")
+
+    diff = commands.add_parser("diff", help="compare two existing JSON reports")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=10.0, help="percent")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        if args.base_url:
+            if not args.manifest:
+                parser.error("--base-url needs --manifest")
+            with open(args.manifest) as f:
+                manifest = json.load(f)
+            results = asyncio.run(run_suite(args.base_url, manifest, args.scenarios,
+                                            args.duration, args.concurrency, args.seed))
+            report = build_report("remote", manifest, args, results)
+        else:
+            database, manifest = prepare_dataset(args)
+            report = run_against(BACKEND_DIR, database, manifest, args)
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(output + "\n")
+        else:
+            print(output)
+        return
+
+    if args.command == "diff":
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        sys.exit(1 if compare_reports(old, new, args.threshold) else 0)
+
+    database, manifest = prepare_dataset(args)
+    reports = []
+    for revision in (args.baseline, args.candidate):
+        worktree = checkout(revision) if revision else None
+        try:
+            print(f"running {revision or 'working tree'}", file=sys.stderr)
+            backend_dir = os.path.join(worktree, "backend") if worktree else BACKEND_DIR
+            report = run_against(backend_dir, database, manifest, args)
+        finally:
+            if worktree:
+                remove_checkout(worktree)
+        path = os.path.join(args.output_dir, f"loadtest-{report['meta']['revision']}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        reports.append(report)
+    regressions = compare_reports(reports[0], reports[1], args.threshold)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Generate a seeded SQLite database for the load tests.
+
+Users, rounds and Gelbfelder scale independently. The tables are written
+with the original (pre-migration) schema, which every revision of the
+backend can start from: newer revisions migrate it on startup. Next to the
+database a ``<db>.json`` manifest records what loadtest.py needs (the shared
+password, active rounds and their players).
+
+    cd backend && python benchmarks/seed_data.py /tmp/gelbapp-load.db \\
+        --users 10000 --rounds 2000 --gelbfelder 200000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import time
+
+import bcrypt # type: ignore
+
+LOAD_PASSWORD = "load-test-password"
+
+SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER NOT NULL PRIMARY KEY, username VARCHAR, email VARCHAR, password VARCHAR, is_beta_tester BOOLEAN
+    )""",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX ix_users_username ON users (username)",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    """CREATE TABLE user_profiles (
+        id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER REFERENCES users (id), first_name VARCHAR,
+        last_name VARCHAR, bio VARCHAR, profile_picture VARCHAR
+    )""",
+    "CREATE INDEX ix_user_profiles_id ON user_profiles (id)",
+    "CREATE UNIQUE INDEX ix_user_profiles_user_id ON user_profiles (user_id)",
+    """CREATE TABLE user_friendships (
+        id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER REFERENCES users (id), friend_id INTEGER REFERENCES users (id),
+        status VARCHAR, CONSTRAINT uq_user_friend UNIQUE (user_id, friend_id)
+    )""",
+    "CREATE INDEX ix_user_friendships_id ON user_friendships (id)",
+    "CREATE INDEX ix_user_friendships_user_id ON user_friendships (user_id)",
+    "CREATE INDEX ix_user_friendships_friend_id ON user_friendships (friend_id)",
+    """CREATE TABLE rounds (
+        id INTEGER NOT NULL PRIMARY KEY, name VARCHAR, creator_id INTEGER NOT NULL REFERENCES users (id),
+        created_at DATETIME, is_active BOOLEAN
+    )""",
+    """CREATE TABLE round_players (
+        id INTEGER NOT NULL PRIMARY KEY, round_id INTEGER NOT NULL REFERENCES rounds (id),
+        user_id INTEGER REFERENCES users (id), guest_name VARCHAR, points INTEGER
+    )""",
+    """CREATE TABLE gelbfelds (
+        id INTEGER NOT NULL PRIMARY KEY, round_id INTEGER NOT NULL REFERENCES rounds (id),
+        round_player_id INTEGER NOT NULL REFERENCES round_players (id), timestamp DATETIME
+    )""",
+    """CREATE TABLE user_statistics (
+        id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL UNIQUE REFERENCES users (id), total_rounds INTEGER,
+        total_points INTEGER, total_gelbfelder INTEGER, best_score_in_round INTEGER
+    )""",
+    "CREATE INDEX ix_user_statistics_id ON user_statistics (id)",
+]
+
+
+def _timestamp(value: datetime.datetime) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def seed(
+    path: str,
+    users: int,
+    rounds: int,
+    gelbfelder: int,
+    friends_per_user: int = 10,
+    players_per_round: int = 4,
+    active_rounds: int = 20,
+    bcrypt_rounds: int = 12,
+    seed_value: int = 42,
+) -> dict:
+    """Write the database at ``path`` (replacing it) and return the manifest."""
+    rng = random.Random(seed_value)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    for statement in SCHEMA:
+        connection.execute(statement)
+
+    # One hash for everyone: hashing per user would dominate seeding time
+    password = bcrypt.hashpw(LOAD_PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=bcrypt_rounds)).decode("utf-8")
+    connection.executemany(
+        "INSERT INTO users (id, username, email, password, is_beta_tester) VALUES (?, ?, ?, ?, 0)",
+        ((i, f"load{i}", f"load{i}@example.com", password) for i in range(1, users + 1)),
+    )
+
+    pairs = set()
+    for user_id in range(1, users + 1):
+        for _ in range(min(friends_per_user, users - 1)):
+            friend_id = rng.randint(1, users)
+            if friend_id != user_id and (friend_id, user_id) not in pairs:
+                pairs.add((user_id, friend_id))
+    statuses = ["accepted"] * 8 + ["pending"] * 2
+    connection.executemany(
+        "INSERT INTO user_friendships (user_id, friend_id, status) VALUES (?, ?, ?)",
+        ((a, b, rng.choice(statuses)) for a, b in sorted(pairs)),
+    )
+
+    now = datetime.datetime.utcnow()
+    round_rows, player_rows = [], []
+    players_of_round = {}
+    player_id = 0
+    for round_id in range(1, rounds + 1):
+        created_at = now - datetime.timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        is_active = round_id > rounds - active_rounds
+        creator_id = rng.randint(1, users)
+        round_rows.append((round_id, f"load round {round_id}", creator_id, _timestamp(created_at), is_active))
+        members = {creator_id} | {rng.randint(1, users) for _ in range(players_per_round - 2)}
+        ids = []
+        for user_id in sorted(members):
+            player_id += 1
+            player_rows.append([player_id, round_id, user_id, None, 0])
+            ids.append(player_id)
+        player_id += 1
+        player_rows.append([player_id, round_id, None, f"guest {round_id}", 0])
+        ids.append(player_id)
+        players_of_round[round_id] = (created_at, ids)
+
+    gelbfeld_rows = []
+    if player_rows:
+        for _ in range(gelbfelder):
+            row = rng.choice(player_rows)
+            row[4] += 1
+            created_at = players_of_round[row[1]][0]
+            tapped_at = created_at + datetime.timedelta(seconds=rng.randint(0, 4 * 3600))
+            gelbfeld_rows.append((row[1], row[0], _timestamp(tapped_at)))
+
+    connection.executemany(
+        "INSERT INTO rounds (id, name, creator_id, created_at, is_active) VALUES (?, ?, ?, ?, ?)", round_rows
+    )
+    connection.executemany(
+        "INSERT INTO round_players (id, round_id, user_id, guest_name, points) VALUES (?, ?, ?, ?, ?)", player_rows
+    )
+    connection.executemany(
+        "INSERT INTO gelbfelds (round_id, round_player_id, timestamp) VALUES (?, ?, ?)", gelbfeld_rows
+    )
+    connection.execute("""
+        INSERT INTO user_statistics (user_id, total_rounds, total_points, total_gelbfelder, best_score_in_round)
+        SELECT user_id, COUNT(*), SUM(points), SUM(points), MAX(points)
+        FROM round_players WHERE user_id IS NOT NULL GROUP BY user_id
+    """)
+    connection.commit()
+    connection.close()
+
+    manifest = {
+        "users": users,
+        "rounds": rounds,
+        "gelbfelder": gelbfelder,
+        "friendships": len(pairs),
+        "password": LOAD_PASSWORD,
+        "seed": seed_value,
+        "active_rounds": [
+            {"round_id": round_id, "player_ids": players_of_round[round_id][1]}
+            for round_id in range(max(1, rounds - active_rounds + 1), rounds + 1)
+        ],
+    }
+    with open(path + ".json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=2_000)
+    parser.add_argument("--gelbfelder", type=int, default=200_000)
+    parser.add_argument("--friends-per-user", type=int, default=10)
+    parser.add_argument("--players-per-round", type=int, default=4)
+    parser.add_argument("--active-rounds", type=int, default=20)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = seed(
+        args.path, args.users, args.rounds, args.gelbfelder, args.friends_per_user,
+        args.players_per_round, args.active_rounds, args.bcrypt_rounds, args.seed,
+    )
+    print(f"seeded {args.path} in {time.perf_counter() - start:.1f} s: {manifest['users']} users, "
+          f"{manifest['friendships']} friendships, {manifest['rounds']} rounds, {manifest['gelbfelder']} Gelbfelder")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,55 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from app.apis import router  # Import the router from apis.py
-from app.database import Base, engine  # Import Base and engine to create the database tables
+from app.database import dispose_async_engine
+from app.friend_events import friend_events
 from fastapi.middleware.cors import CORSMiddleware
 from app.models import Round, RoundPlayer, Gelbfeld  # Import your models to ensure they are registered with SQLAlchemy
+from app.pictures import UploadLimitMiddleware, shutdown_image_pool
+from app.avatars import run_garbage_collector
+from app.utils import PasswordPoolSaturated, password_hasher
+from app.search import create_search_index
+from app.migrate import prepare_database
+from app.logs import setup_logging, shutdown_logging
+from app.profiling import install as install_profiling
+from contextlib import asynccontextmanager
+import asyncio
 import os
 
-Base.metadata.create_all(bind=engine)
+setup_logging()
+prepare_database()
+create_search_index()
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    avatar_gc = asyncio.create_task(run_garbage_collector())
+    yield
+    avatar_gc.cancel()
+    shutdown_image_pool()
+    password_hasher.shutdown()
+    await friend_events.close()
+    await dispose_async_engine()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(PasswordPoolSaturated)
+async def password_pool_saturated_handler(request: Request, exc: PasswordPoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many login attempts in progress, please retry"},
+        headers={"Retry-After": "1"},
+    )
 
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
+# Oversized uploads are refused before their multipart form is parsed
+app.add_middleware(UploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or restrict to your frontend URL like "http://localhost:5000"
@@ -24,3 +59,4 @@ app.add_middleware(
 )
 # Include the router with the API routes
 app.include_router(router)
+install_profiling(app)
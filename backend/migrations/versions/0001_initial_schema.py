@@ -0,0 +1,101 @@
+"""Initial schema, as Base.metadata.create_all() created it before migrations
+
+Databases created before migrations existed are stamped with this revision
+at startup (see app/migrate.py) and upgraded from here.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op # type: ignore
+import sqlalchemy as sa # type: ignore
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String()),
+        sa.Column("email", sa.String()),
+        sa.Column("password", sa.String()),
+        sa.Column("is_beta_tester", sa.Boolean()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "user_profiles",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("first_name", sa.String()),
+        sa.Column("last_name", sa.String()),
+        sa.Column("bio", sa.String()),
+        sa.Column("profile_picture", sa.String()),
+    )
+    op.create_index("ix_user_profiles_id", "user_profiles", ["id"])
+    op.create_index("ix_user_profiles_user_id", "user_profiles", ["user_id"], unique=True)
+
+    op.create_table(
+        "user_friendships",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("friend_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("status", sa.String()),
+        sa.UniqueConstraint("user_id", "friend_id", name="uq_user_friend"),
+    )
+    op.create_index("ix_user_friendships_id", "user_friendships", ["id"])
+    op.create_index("ix_user_friendships_user_id", "user_friendships", ["user_id"])
+    op.create_index("ix_user_friendships_friend_id", "user_friendships", ["friend_id"])
+
+    op.create_table(
+        "rounds",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("creator_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("is_active", sa.Boolean()),
+    )
+
+    op.create_table(
+        "round_players",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("round_id", sa.Integer(), sa.ForeignKey("rounds.id"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("guest_name", sa.String(), nullable=True),
+        sa.Column("points", sa.Integer()),
+    )
+
+    op.create_table(
+        "gelbfelds",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("round_id", sa.Integer(), sa.ForeignKey("rounds.id"), nullable=False),
+        sa.Column("round_player_id", sa.Integer(), sa.ForeignKey("round_players.id"), nullable=False),
+        sa.Column("timestamp", sa.DateTime()),
+    )
+
+    op.create_table(
+        "user_statistics",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False, unique=True),
+        sa.Column("total_rounds", sa.Integer()),
+        sa.Column("total_points", sa.Integer()),
+        sa.Column("total_gelbfelder", sa.Integer()),
+        sa.Column("best_score_in_round", sa.Integer()),
+    )
+    op.create_index("ix_user_statistics_id", "user_statistics", ["id"])
+
+
+def downgrade():
+    op.drop_table("user_statistics")
+    op.drop_table("gelbfelds")
+    op.drop_table("round_players")
+    op.drop_table("rounds")
+    op.drop_table("user_friendships")
+    op.drop_table("user_profiles")
+    op.drop_table("users")
@@ -0,0 +1,63 @@
+"""Columns, tables and indexes added while the schema was managed by create_all()
+
+Covers gelbfelds.client_event_id, avatar_blobs and the indexes for
+statistics, scoreboards, offline batches and case-insensitive logins.
+Databases from that period may already have some of these (create_all()
+plus the old add-missing-columns/indexes helpers), so every step checks
+first.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op # type: ignore
+import sqlalchemy as sa # type: ignore
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_user_statistics_total_points", "user_statistics", ["total_points"], False),
+    ("ix_round_players_round_id", "round_players", ["round_id"], False),
+    ("ix_round_players_user_id_points", "round_players", ["user_id", "points"], False),
+    ("ix_gelbfelds_round_id", "gelbfelds", ["round_id"], False),
+    ("ix_gelbfelds_round_player_id", "gelbfelds", ["round_player_id"], False),
+    ("uq_gelbfelds_round_client_event", "gelbfelds", ["round_id", "client_event_id"], True),
+    ("uq_users_username_lower", "users", [sa.text("lower(username)")], True),
+    ("uq_users_email_lower", "users", [sa.text("lower(email)")], True),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if "client_event_id" not in {c["name"] for c in inspector.get_columns("gelbfelds")}:
+        op.add_column("gelbfelds", sa.Column("client_event_id", sa.String(), nullable=True))
+
+    if not inspector.has_table("avatar_blobs"):
+        op.create_table(
+            "avatar_blobs",
+            sa.Column("sha256", sa.String(), primary_key=True),
+            sa.Column("path", sa.String(), nullable=False, unique=True),
+            sa.Column("ref_count", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime()),
+        )
+
+    for name, table, columns, unique in INDEXES:
+        try:
+            op.create_index(name, table, columns, unique=unique, if_not_exists=True)
+        except sa.exc.IntegrityError as e:
+            raise RuntimeError(
+                f"Cannot create unique index {name}: table {table} contains "
+                f"rows that violate it; resolve them manually and rerun the migration"
+            ) from e
+
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    op.drop_table("avatar_blobs")
+    with op.batch_alter_table("gelbfelds") as batch_op:
+        batch_op.drop_column("client_event_id")
@@ -0,0 +1,45 @@
+"""Composite indexes for the friendship, round creation and scoreboard queries
+
+- user_friendships: (user_id, status) and (friend_id, status) serve the
+  friend lists and request inboxes; they replace the single-column
+  user_id/friend_id indexes (uq_user_friend also leads with user_id).
+- rounds: (name, is_active) for the duplicate-name check in create_round.
+- round_players: (round_id, user_id) replaces the round_id index, and
+  guest_name gets one so the guest-name check is not a table scan.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op # type: ignore
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_user_friendships_user_id_status", "user_friendships", ["user_id", "status"])
+    op.create_index("ix_user_friendships_friend_id_status", "user_friendships", ["friend_id", "status"])
+    op.drop_index("ix_user_friendships_user_id", table_name="user_friendships")
+    op.drop_index("ix_user_friendships_friend_id", table_name="user_friendships")
+
+    op.create_index("ix_rounds_name_is_active", "rounds", ["name", "is_active"])
+
+    op.create_index("ix_round_players_round_id_user_id", "round_players", ["round_id", "user_id"])
+    op.drop_index("ix_round_players_round_id", table_name="round_players")
+    op.create_index("ix_round_players_guest_name", "round_players", ["guest_name"])
+
+
+def downgrade():
+    op.drop_index("ix_round_players_guest_name", table_name="round_players")
+    op.create_index("ix_round_players_round_id", "round_players", ["round_id"])
+    op.drop_index("ix_round_players_round_id_user_id", table_name="round_players")
+
+    op.drop_index("ix_rounds_name_is_active", table_name="rounds")
+
+    op.create_index("ix_user_friendships_friend_id", "user_friendships", ["friend_id"])
+    op.create_index("ix_user_friendships_user_id", "user_friendships", ["user_id"])
+    op.drop_index("ix_user_friendships_friend_id_status", table_name="user_friendships")
+    op.drop_index("ix_user_friendships_user_id_status", table_name="user_friendships")
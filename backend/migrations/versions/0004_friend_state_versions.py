@@ -0,0 +1,35 @@
+"""Per-user friend state versions and change log for /friends/state
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op # type: ignore
+import sqlalchemy as sa # type: ignore
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "friend_state_versions",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "friendship_changes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("friendship_id", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_friendship_changes_user_id_version", "friendship_changes", ["user_id", "version"])
+
+
+def downgrade():
+    op.drop_index("ix_friendship_changes_user_id_version", table_name="friendship_changes")
+    op.drop_table("friendship_changes")
+    op.drop_table("friend_state_versions")
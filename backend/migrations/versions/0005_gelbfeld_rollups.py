@@ -0,0 +1,57 @@
+"""Hourly Gelbfeld rollups for the activity statistics
+
+Creates gelbfeld_rollups and fills it from the existing gelbfelds, so the
+activity endpoints cover history from before the table existed.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from collections import Counter
+
+from alembic import op # type: ignore
+import sqlalchemy as sa # type: ignore
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+GLOBAL_SCOPE = 0
+
+
+def upgrade():
+    rollups = op.create_table(
+        "gelbfeld_rollups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("gelbfelder", sa.Integer(), nullable=False),
+    )
+    op.create_index(
+        "uq_gelbfeld_rollups_user_id_bucket_start", "gelbfeld_rollups", ["user_id", "bucket_start"], unique=True
+    )
+
+    gelbfelds = sa.table("gelbfelds", sa.column("round_player_id"), sa.column("timestamp", sa.DateTime()))
+    round_players = sa.table("round_players", sa.column("id"), sa.column("user_id"))
+    events = op.get_bind().execute(
+        sa.select(round_players.c.user_id, gelbfelds.c.timestamp)
+        .join(round_players, round_players.c.id == gelbfelds.c.round_player_id)
+        .where(gelbfelds.c.timestamp.isnot(None))
+    )
+    counts = Counter()
+    for user_id, timestamp in events:
+        bucket = timestamp.replace(minute=0, second=0, microsecond=0)
+        counts[(GLOBAL_SCOPE, bucket)] += 1
+        if user_id is not None:
+            counts[(user_id, bucket)] += 1
+    if counts:
+        op.bulk_insert(rollups, [
+            {"user_id": user_id, "bucket_start": bucket, "gelbfelder": count}
+            for (user_id, bucket), count in counts.items()
+        ])
+
+
+def downgrade():
+    op.drop_index("uq_gelbfeld_rollups_user_id_bucket_start", table_name="gelbfeld_rollups")
+    op.drop_table("gelbfeld_rollups")
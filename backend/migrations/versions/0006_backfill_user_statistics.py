@@ -0,0 +1,67 @@
+"""Backfill user_statistics from the round data
+
+The write paths only keep user_statistics up to date from the moment they
+were introduced, so databases from before that had an empty leaderboard.
+This recomputes every row the same way ``app.statistics.rebuild_user_statistics``
+does, in one INSERT ... SELECT.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op # type: ignore
+import sqlalchemy as sa # type: ignore
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    round_players = sa.table(
+        "round_players", sa.column("id"), sa.column("user_id"), sa.column("points")
+    )
+    gelbfelds = sa.table("gelbfelds", sa.column("id"), sa.column("round_player_id"))
+    user_statistics = sa.table(
+        "user_statistics",
+        sa.column("user_id"),
+        sa.column("total_rounds"),
+        sa.column("total_points"),
+        sa.column("total_gelbfelder"),
+        sa.column("best_score_in_round"),
+    )
+
+    gelbfelder = (
+        sa.select(
+            round_players.c.user_id.label("user_id"),
+            sa.func.count(gelbfelds.c.id).label("total_gelbfelder"),
+        )
+        .join(gelbfelds, gelbfelds.c.round_player_id == round_players.c.id)
+        .where(round_players.c.user_id.isnot(None))
+        .group_by(round_players.c.user_id)
+        .subquery()
+    )
+    aggregates = (
+        sa.select(
+            round_players.c.user_id,
+            sa.func.count(round_players.c.id),
+            sa.func.coalesce(sa.func.sum(round_players.c.points), 0),
+            sa.func.coalesce(gelbfelder.c.total_gelbfelder, 0),
+            sa.func.coalesce(sa.func.max(round_players.c.points), 0),
+        )
+        .outerjoin(gelbfelder, gelbfelder.c.user_id == round_players.c.user_id)
+        .where(round_players.c.user_id.isnot(None))
+        .group_by(round_players.c.user_id)
+    )
+
+    op.execute(user_statistics.delete())
+    op.execute(user_statistics.insert().from_select(
+        ["user_id", "total_rounds", "total_points", "total_gelbfelder", "best_score_in_round"],
+        aggregates,
+    ))
+
+
+def downgrade():
+    # Data only; the rows stay valid for the previous revision
+    pass
@@ -0,0 +1,23 @@
+"""Index for the round history pages
+
+round_players (user_id, id) lets /statistics/my_rounds read a page in
+order straight from the index instead of sorting the user's whole history.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op # type: ignore
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_round_players_user_id_id", "round_players", ["user_id", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_round_players_user_id_id", table_name="round_players")
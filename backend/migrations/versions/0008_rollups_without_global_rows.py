@@ -0,0 +1,62 @@
+"""Sum the global Gelbfeld activity at read time
+
+Every tap used to upsert the one (user_id 0, hour) row shared by all
+rounds, which serialized concurrent taps. Guests are now counted per round
+under user_id = -round_id and the global series is summed per hour from
+all rows, read through a new bucket_start index. This drops the user_id 0
+rows and splits their guest share into per-round rows.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from collections import Counter
+
+from alembic import op # type: ignore
+import sqlalchemy as sa # type: ignore
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+GLOBAL_SCOPE = 0
+
+rollups = sa.table(
+    "gelbfeld_rollups",
+    sa.column("user_id", sa.Integer()),
+    sa.column("bucket_start", sa.DateTime()),
+    sa.column("gelbfelder", sa.Integer()),
+)
+
+
+def upgrade():
+    op.create_index("ix_gelbfeld_rollups_bucket_start", "gelbfeld_rollups", ["bucket_start"])
+
+    gelbfelds = sa.table("gelbfelds", sa.column("round_player_id"), sa.column("timestamp", sa.DateTime()))
+    round_players = sa.table("round_players", sa.column("id"), sa.column("user_id"), sa.column("round_id"))
+    events = op.get_bind().execute(
+        sa.select(round_players.c.round_id, gelbfelds.c.timestamp)
+        .join(round_players, round_players.c.id == gelbfelds.c.round_player_id)
+        .where(gelbfelds.c.timestamp.isnot(None), round_players.c.user_id.is_(None))
+    )
+    counts = Counter()
+    for round_id, timestamp in events:
+        counts[(-round_id, timestamp.replace(minute=0, second=0, microsecond=0))] += 1
+
+    op.execute(rollups.delete().where(rollups.c.user_id == GLOBAL_SCOPE))
+    if counts:
+        op.bulk_insert(rollups, [
+            {"user_id": scope, "bucket_start": bucket, "gelbfelder": count}
+            for (scope, bucket), count in counts.items()
+        ])
+
+
+def downgrade():
+    totals = (
+        sa.select(sa.literal(GLOBAL_SCOPE), rollups.c.bucket_start, sa.func.sum(rollups.c.gelbfelder))
+        .group_by(rollups.c.bucket_start)
+    )
+    op.execute(rollups.insert().from_select(["user_id", "bucket_start", "gelbfelder"], totals))
+    op.execute(rollups.delete().where(rollups.c.user_id < GLOBAL_SCOPE))
+    op.drop_index("ix_gelbfeld_rollups_bucket_start", table_name="gelbfeld_rollups")
@@ -0,0 +1,77 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from itertools import count
+
+# The app binds its engine and uploads/ directory on import, so point them at a scratch directory first
+TEST_DIR = tempfile.mkdtemp(prefix="gelbapp-tests-")
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+os.environ["GELBAPP_DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'gelbapp.db')}"
+os.environ.pop("GELBAPP_ASYNC_DATABASE_URL", None)
+os.environ.pop("GELBAPP_FRIEND_EVENTS_URL", None)
+os.chdir(TEST_DIR)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest # type: ignore
+from fastapi.testclient import TestClient # type: ignore
+from sqlalchemy import event # type: ignore
+from sqlalchemy.engine import Engine # type: ignore
+
+import main
+from app.database import SessionLocal
+from app.models import User, UserFriendship
+from app.utils import create_access_token
+
+_user_ids = count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    """Insert a user directly (no bcrypt) and return it with a valid token."""
+    def make(prefix: str = "user"):
+        n = next(_user_ids)
+        user = User(username=f"{prefix}{n}", email=f"{prefix}{n}@example.com", password="unused")
+        db.add(user)
+        db.commit()
+        return user, create_access_token(data={"email": user.email})
+    return make
+
+
+@pytest.fixture
+def befriend(db):
+    def add(user: User, friend: User, status: str = "accepted"):
+        db.add(UserFriendship(user_id=user.id, friend_id=friend.id, status=status))
+        db.commit()
+    return add
+
+
+@contextmanager
+def count_queries():
+    """Collect ``(statement, parameters)`` of every SQL statement any engine (sync or async) runs inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
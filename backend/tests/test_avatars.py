@@ -0,0 +1,109 @@
+"""Profile picture uploads keep avatar_blobs.ref_count exact, whatever happens to the request."""
+import hashlib
+import io
+import os
+
+import pytest # type: ignore
+from PIL import Image # type: ignore
+
+from app import apis
+from app.avatars import UPLOAD_DIR
+from app.pictures import MAX_UPLOAD_BYTES, MULTIPART_OVERHEAD_BYTES
+from app.models import AvatarBlob, UserProfile
+
+
+def _png(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _blob_path(data: bytes) -> str:
+    return os.path.join(UPLOAD_DIR, hashlib.sha256(data).hexdigest() + ".png")
+
+
+def _upload(client, token: str, data: bytes):
+    return client.post(
+        "/upload_profile_picture", data={"token": token}, files={"file": ("avatar.png", data, "image/png")}
+    )
+
+
+def _ref_count(db, path: str):
+    db.expire_all()
+    return db.query(AvatarBlob.ref_count).filter(AvatarBlob.path == path).scalar()
+
+
+def test_upload_and_reupload_keep_one_reference(client, db, make_user):
+    user, token = make_user("avatar")
+    first, second = _png((10, 20, 30)), _png((40, 50, 60))
+
+    assert _upload(client, token, first).status_code == 200
+    assert _upload(client, token, first).status_code == 200
+    assert _ref_count(db, _blob_path(first)) == 1
+
+    response = _upload(client, token, second)
+    assert response.json()["path"] == _blob_path(second)
+    assert _ref_count(db, _blob_path(first)) == 0
+    assert _ref_count(db, _blob_path(second)) == 1
+    profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).one()
+    assert profile.profile_picture == _blob_path(second)
+
+
+def test_invalid_image_releases_its_claim(client, db, make_user):
+    _, token = make_user("avatar")
+    data = b"not an image at all"
+    assert _upload(client, token, data).status_code == 400
+    assert _ref_count(db, _blob_path(data)) == 0
+
+
+@pytest.mark.parametrize("stage", ["render", "assign"])
+def test_unexpected_failure_releases_its_claim(client, db, make_user, monkeypatch, stage):
+    _, token = make_user("avatar")
+    data = _png((70 if stage == "render" else 80, 90, 100))
+
+    async def failing_render(source_path, original_path):
+        raise OSError("disk full")
+
+    def failing_assign(db, user_id, path):
+        raise RuntimeError("database went away")
+
+    if stage == "render":
+        monkeypatch.setattr(apis, "render_avatar_variants", failing_render)
+    else:
+        monkeypatch.setattr(apis, "assign_profile_picture", failing_assign)
+
+    with pytest.raises((OSError, RuntimeError)):
+        _upload(client, token, data)
+    assert _ref_count(db, _blob_path(data)) == 0
+    assert not [name for name in os.listdir(UPLOAD_DIR) if name.startswith((".upload-", ".render-"))]
+
+
+def test_oversized_upload_is_refused_before_the_form_is_parsed(client, monkeypatch):
+    def parse_form(*args, **kwargs):
+        raise AssertionError("the multipart form was parsed")
+
+    monkeypatch.setattr("starlette.requests.Request._get_form", parse_form)
+    body = b"x" * (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES + 1)
+
+    response = client.post(
+        "/upload_profile_picture",
+        content=body,
+        headers={"Content-Type": "multipart/form-data; boundary=x", "Content-Length": str(len(body))},
+    )
+    assert response.status_code == 413
+
+
+def test_upload_without_content_length_is_cut_off_at_the_limit(client):
+    chunk = b"x" * (1024 * 1024)
+    sent = 0
+
+    def body():
+        nonlocal sent
+        while sent <= MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+            sent += len(chunk)
+            yield chunk
+
+    response = client.post(
+        "/upload_profile_picture", content=body(), headers={"Content-Type": "multipart/form-data; boundary=x"}
+    )
+    assert response.status_code == 413
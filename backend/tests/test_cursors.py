@@ -0,0 +1,33 @@
+"""Malformed pagination cursors are a 400, never a 500."""
+import base64
+import json
+
+import pytest # type: ignore
+
+
+def _cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+
+@pytest.mark.parametrize("value", [
+    [0, {"a": 1}], [0, 5], [0, None], [1, "bob"], [1, 1.5], [1, True], [1, 2 ** 70], [True, None], [2, None], [0], "x",
+])
+def test_search_rejects_malformed_cursor(client, make_user, value):
+    _, token = make_user("cursor")
+    response = client.post("/search_users", json={"token": token, "query": "cursor", "cursor": _cursor(value)})
+    assert response.status_code == 400, response.text
+
+
+@pytest.mark.parametrize("value", [[0, "cursor"], [1, None], [1, 3]])
+def test_search_accepts_wellformed_cursor(client, make_user, value):
+    _, token = make_user("cursor")
+    response = client.post("/search_users", json={"token": token, "query": "cursor", "cursor": _cursor(value)})
+    assert response.status_code == 200, response.text
+
+
+@pytest.mark.parametrize("raw", ["[1e400]", "[-1e400]", "[NaN]", "[1" + "0" * 70 + "]", "[-1]", "[]", "{}", "[\"x\"]"])
+def test_history_rejects_malformed_cursor(client, make_user, raw):
+    _, token = make_user("history")
+    cursor = base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+    response = client.post("/statistics/my_rounds", params={"cursor": cursor}, json={"token": token})
+    assert response.status_code == 400, response.text
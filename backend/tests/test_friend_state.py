@@ -0,0 +1,88 @@
+"""/friends/state answers unchanged polls with 304 and older versions with deltas."""
+from app.apis import _ScoreTracker
+
+
+def _state(client, token, since=None, headers=None):
+    params = {} if since is None else {"since": since}
+    return client.post("/friends/state", json={"token": token}, params=params, headers=headers or {})
+
+
+def _send_request(client, token, to_user):
+    assert client.post("/add_friend", json={"token": token, "friend_username": to_user.username}).status_code == 200
+
+
+def test_unchanged_state_is_not_modified(client, make_user):
+    alice, alice_token = make_user("state")
+    bob, bob_token = make_user("state")
+    _send_request(client, bob_token, alice)
+
+    first = _state(client, alice_token)
+    assert first.status_code == 200
+    version = first.json()["version"]
+
+    assert _state(client, alice_token, since=version).status_code == 304
+    revalidated = _state(client, alice_token, headers={"If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == first.headers["etag"]
+
+    request_id = first.json()["incoming_requests"][0]["request_id"]
+    assert client.post("/accept_friend", params={"request_id": request_id}, json={"token": alice_token}).status_code == 200
+    changed = _state(client, alice_token, headers={"If-None-Match": first.headers["etag"]})
+    assert changed.status_code == 200
+    assert changed.json()["version"] > version
+
+
+LIST_KEYS = {"friends": "friendship_id", "incoming_requests": "request_id", "outgoing_requests": "request_id"}
+
+
+def _apply(state: dict, delta: dict) -> dict:
+    """What a client does with a delta: drop the changed ids, then add the returned entries."""
+    merged = {}
+    for name, key in LIST_KEYS.items():
+        kept = [entry for entry in state[name] if entry[key] not in delta["changed"]]
+        merged[name] = sorted(kept + delta[name], key=lambda entry: entry[key])
+    return merged
+
+
+def test_delta_applied_to_an_old_state_gives_the_current_state(client, make_user):
+    alice, alice_token = make_user("delta")
+    bob, bob_token = make_user("delta")
+    carol, carol_token = make_user("delta")
+    dave, _ = make_user("delta")
+    _send_request(client, alice_token, dave)
+    old = _state(client, alice_token).json()
+
+    _send_request(client, bob_token, alice)
+    _send_request(client, carol_token, alice)
+    incoming = {entry["from_user_id"]: entry["request_id"] for entry in _state(client, alice_token).json()["incoming_requests"]}
+    client.post("/accept_friend", params={"request_id": incoming[bob.id]}, json={"token": alice_token})
+    client.post("/cancel_friend_request", params={"request_id": old["outgoing_requests"][0]["request_id"]}, json={"token": alice_token})
+
+    delta = _state(client, alice_token, since=old["version"]).json()
+    assert delta["delta"] is True
+    assert set(delta["changed"]) == {incoming[bob.id], incoming[carol.id], old["outgoing_requests"][0]["request_id"]}
+
+    full = _state(client, alice_token).json()
+    assert full["delta"] is False
+    assert delta["version"] == full["version"]
+    assert _apply(old, delta) == _apply(full, {"changed": [], **{name: [] for name in LIST_KEYS}})
+    assert [friend["id"] for friend in full["friends"]] == [bob.id]
+    assert [entry["from_user_id"] for entry in full["incoming_requests"]] == [carol.id]
+    assert full["outgoing_requests"] == []
+
+
+def test_score_tracker_skips_points_the_snapshot_already_has():
+    tracker = _ScoreTracker({"scores": [{"player_id": 1, "points": 3}, {"player_id": 2, "points": None}], "field_count": 3})
+
+    # Committed before the snapshot was read, delivered after it
+    assert tracker.apply({"type": "point", "player_id": 1, "points": 3}) is None
+    assert tracker.apply({"type": "point", "player_id": 1, "points": 5})["field_count"] == 5
+    # Published out of order: the total it carries is already known
+    assert tracker.apply({"type": "point", "player_id": 1, "points": 4}) is None
+    assert tracker.apply({"type": "point", "player_id": 2, "points": 1}) == {
+        "type": "point", "player_id": 2, "points": 1, "field_count": 6,
+    }
+
+    tracker.reset({"scores": [{"player_id": 1, "points": 9}], "field_count": 9})
+    assert tracker.apply({"type": "point", "player_id": 1, "points": 9}) is None
+    assert tracker.apply({"type": "point", "player_id": 3, "points": 1})["field_count"] == 10
@@ -0,0 +1,61 @@
+"""Case-insensitive usernames and emails, looked up through the lower() expression indexes."""
+import threading
+
+from conftest import count_queries
+
+
+def _register(client, username: str, email: str):
+    return client.post("/register", json={"username": username, "email": email, "password": "secret"})
+
+
+def test_login_seeks_both_lower_indexes(client, db):
+    assert _register(client, "PlanUser", "PlanUser@example.com").status_code == 200
+
+    with count_queries() as statements:
+        response = client.post("/login", json={"username_or_email": "planuser@EXAMPLE.com", "password": "secret"})
+    assert response.status_code == 200, response.text
+
+    statement, parameters = next(
+        (statement, parameters) for statement, parameters in statements if "lower(users.username)" in statement
+    )
+    plan = [row[3] for row in db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+    assert "MULTI-INDEX OR" in plan
+    assert any("USING INDEX uq_users_username_lower" in step for step in plan), plan
+    assert any("USING INDEX uq_users_email_lower" in step for step in plan), plan
+    assert not any(step.startswith("SCAN users") for step in plan), plan
+
+
+def test_register_rejects_username_differing_only_in_case(client):
+    assert _register(client, "casealice", "casealice@example.com").status_code == 200
+
+    response = _register(client, "CaseAlice", "other-casealice@example.com")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already taken"
+
+
+def test_register_rejects_email_differing_only_in_case(client):
+    assert _register(client, "casebob", "casebob@example.com").status_code == 200
+
+    response = _register(client, "casebob2", "CaseBob@Example.com")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+
+
+def test_login_answers_503_when_password_pool_is_full(client, monkeypatch):
+    from app.utils import password_hasher
+
+    assert _register(client, "busyuser", "busyuser@example.com").status_code == 200
+
+    full = threading.BoundedSemaphore(1)
+    full.acquire()
+    monkeypatch.setattr(password_hasher, "_slots", full)
+    # The rejection must not go through the route threadpool
+    monkeypatch.setattr("anyio.to_thread.run_sync", _no_threads)
+
+    response = client.post("/login", json={"username_or_email": "busyuser", "password": "secret"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+async def _no_threads(*args, **kwargs):
+    raise AssertionError("login took a threadpool thread")
@@ -0,0 +1,82 @@
+"""Offline taps replayed through /points/add_batch are stored once per idempotency key."""
+from contextlib import contextmanager
+
+from sqlalchemy import event # type: ignore
+from sqlalchemy.engine import Engine # type: ignore
+
+from app.models import Gelbfeld, Round, RoundPlayer
+
+
+def _round(db, owner):
+    round = Round(name=f"batch{owner.id}", creator_id=owner.id)
+    db.add(round)
+    db.flush()
+    player = RoundPlayer(round_id=round.id, user_id=owner.id)
+    db.add(player)
+    db.commit()
+    return round.id, player.id
+
+
+def _events(player_id, *keys):
+    return [
+        {"round_player_id": player_id, "timestamp": f"2026-05-01T10:00:0{n}Z", "idempotency_key": key}
+        for n, key in enumerate(keys)
+    ]
+
+
+def _points(db, player_id):
+    db.expire_all()
+    return db.query(RoundPlayer.points).filter(RoundPlayer.id == player_id).scalar()
+
+
+def _stored(db, round_id):
+    return db.query(Gelbfeld).filter(Gelbfeld.round_id == round_id).count()
+
+
+def test_resent_and_repeated_keys_are_counted_once(client, db, make_user):
+    owner, token = make_user("batch")
+    round_id, player_id = _round(db, owner)
+
+    first = client.post("/points/add_batch", json={
+        "token": token, "round_id": round_id, "events": _events(player_id, "k1", "k2", "k1"),
+    }).json()
+    assert (first["accepted"], first["duplicates"]) == (2, 1)
+    assert first["scores"] == [{"player_id": player_id, "points": 2}]
+
+    # The client lost the response and resends, with one new tap
+    retry = client.post("/points/add_batch", json={
+        "token": token, "round_id": round_id, "events": _events(player_id, "k1", "k2", "k3"),
+    }).json()
+    assert (retry["accepted"], retry["duplicates"]) == (1, 2)
+
+    assert _points(db, player_id) == 3
+    assert _stored(db, round_id) == 3
+
+
+@contextmanager
+def _dedupe_lookup_misses():
+    """Make the duplicate SELECT find nothing, as if a concurrent request had not committed yet."""
+    def rewrite(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "client_event_id IN" in statement:
+            statement = statement.replace("client_event_id IN", "client_event_id || 'x' IN")
+        return statement, parameters
+
+    event.listen(Engine, "before_cursor_execute", rewrite, retval=True)
+    try:
+        yield
+    finally:
+        event.remove(Engine, "before_cursor_execute", rewrite)
+
+
+def test_concurrent_duplicate_gets_409_and_changes_nothing(client, db, make_user):
+    owner, token = make_user("batchrace")
+    round_id, player_id = _round(db, owner)
+    payload = {"token": token, "round_id": round_id, "events": _events(player_id, "race")}
+    assert client.post("/points/add_batch", json=payload).json()["accepted"] == 1
+
+    with _dedupe_lookup_misses():
+        response = client.post("/points/add_batch", json=payload)
+    assert response.status_code == 409
+
+    assert _points(db, player_id) == 1
+    assert _stored(db, round_id) == 1
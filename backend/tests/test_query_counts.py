@@ -0,0 +1,49 @@
+"""The friend and search endpoints must not issue a query per friendship or hit."""
+import pytest # type: ignore
+
+from conftest import count_queries
+
+# path, extra body, key of the list in the response (None: the body is the list)
+ENDPOINTS = [
+    ("/friends", {}, "friends"),
+    ("/friend_requests/incoming", {}, "incoming_requests"),
+    ("/friend_requests/outgoing", {}, "outgoing_requests"),
+    ("/search_users", {"limit": 50}, None),
+]
+
+
+def _grow(make_user, befriend, owner, per_kind: int):
+    """Add ``per_kind`` friends, incoming and outgoing requests to ``owner``, all named after it."""
+    prefix = f"{owner.username}peer"
+    for _ in range(per_kind):
+        friend, _ = make_user(prefix)
+        befriend(owner, friend)
+        requester, _ = make_user(prefix)
+        befriend(requester, owner, status="pending")
+        requested, _ = make_user(prefix)
+        befriend(owner, requested, status="pending")
+
+
+def _measure(client, path: str, token: str, body: dict, key):
+    with count_queries() as statements:
+        response = client.post(path, json={"token": token, **body})
+    assert response.status_code == 200, response.text
+    rows = response.json() if key is None else response.json()[key]
+    return len(statements), len(rows)
+
+
+@pytest.mark.parametrize("path,body,key", ENDPOINTS)
+def test_query_count_does_not_grow_with_friendships(client, make_user, befriend, path, body, key):
+    owner, token = make_user("qcowner")
+    # Search hits are the owner's peers only
+    body = dict(body, query=f"{owner.username}peer") if path == "/search_users" else body
+    _grow(make_user, befriend, owner, 2)
+    # Warm the token cache so both measurements run the same code path
+    client.post(path, json={"token": token, **body})
+    few_queries, few_rows = _measure(client, path, token, body, key)
+
+    _grow(make_user, befriend, owner, 10)
+    many_queries, many_rows = _measure(client, path, token, body, key)
+
+    assert many_rows > few_rows
+    assert 0 < many_queries == few_queries
@@ -0,0 +1,57 @@
+"""Taps only write their own players' rollup rows; the global series is summed when read."""
+from app.models import GelbfeldRollup, Round, RoundPlayer
+from app.rollups import GLOBAL_SCOPE, guest_scope, rebuild_rollups
+
+
+def _round(db, owner):
+    round = Round(name=f"rollup{owner.id}", creator_id=owner.id)
+    db.add(round)
+    db.flush()
+    players = [RoundPlayer(round_id=round.id, user_id=owner.id), RoundPlayer(round_id=round.id, guest_name="Guest")]
+    db.add_all(players)
+    db.commit()
+    return round.id, [player.id for player in players]
+
+
+def _tap(client, token, round_id, player_id):
+    response = client.post("/points/add", json={"token": token, "round_id": round_id, "round_player_id": player_id})
+    assert response.json()["message"] == "Point added"
+
+
+def _rows(db):
+    db.expire_all()
+    return {(row.user_id, row.bucket_start): row.gelbfelder for row in db.query(GelbfeldRollup)}
+
+
+def test_taps_in_different_rounds_share_no_rollup_row(client, db, make_user):
+    before = client.get("/statistics/activity").json()["total"]
+    alice, alice_token = make_user("rollup")
+    bob, bob_token = make_user("rollup")
+    alice_round, (alice_player, alice_guest) = _round(db, alice)
+    bob_round, (bob_player, bob_guest) = _round(db, bob)
+
+    _tap(client, alice_token, alice_round, alice_player)
+    _tap(client, alice_token, alice_round, alice_guest)
+    _tap(client, bob_token, bob_round, bob_player)
+    _tap(client, bob_token, bob_round, bob_guest)
+    _tap(client, bob_token, bob_round, bob_guest)
+
+    rows = _rows(db)
+    assert not any(scope == GLOBAL_SCOPE for scope, _ in rows)
+    scopes = {scope for scope, _ in rows}
+    assert {alice.id, bob.id, guest_scope(alice_round), guest_scope(bob_round)} <= scopes
+
+    activity = client.get("/statistics/activity").json()
+    assert activity["total"] == before + 5
+    assert sum(activity["hours"]) == activity["total"]
+
+
+def test_rebuild_reproduces_the_rows_written_by_taps(client, db, make_user):
+    owner, token = make_user("rebuild")
+    round_id, (player, guest) = _round(db, owner)
+    _tap(client, token, round_id, player)
+    _tap(client, token, round_id, guest)
+
+    written = _rows(db)
+    rebuild_rollups(db)
+    assert _rows(db) == written
@@ -0,0 +1,50 @@
+"""Scoreboards cached per worker must pick up writes made by other workers."""
+import time
+
+from sqlalchemy import update # type: ignore
+
+from app.models import Round, RoundPlayer
+from app.scoreboard_cache import ScoreboardCache, scoreboard_cache
+
+
+def _round(db, owner):
+    round = Round(name=f"cache{owner.id}", creator_id=owner.id)
+    db.add(round)
+    db.flush()
+    player = RoundPlayer(round_id=round.id, user_id=owner.id, points=0)
+    db.add(player)
+    db.commit()
+    return round.id, player.id
+
+
+def test_write_by_another_worker_is_served_after_the_ttl(client, db, make_user, monkeypatch):
+    monkeypatch.setattr(scoreboard_cache, "ttl", 0.2)
+    owner, _ = make_user("cache")
+    round_id, player_id = _round(db, owner)
+
+    first = client.get(f"/rounds/{round_id}/scores")
+    # Another worker's tap: committed, but this process's cache is not invalidated
+    db.execute(update(RoundPlayer).where(RoundPlayer.id == player_id).values(points=3))
+    db.commit()
+    assert client.get(f"/rounds/{round_id}/scores").json()["scores"][0]["points"] == 0
+
+    time.sleep(0.3)
+    fresh = client.get(f"/rounds/{round_id}/scores", headers={"If-None-Match": first.headers["etag"]})
+    assert fresh.status_code == 200
+    assert fresh.json()["scores"][0]["points"] == 3
+    assert fresh.headers["etag"] != first.headers["etag"]
+
+
+def test_etag_depends_only_on_content():
+    one, other = ScoreboardCache(), ScoreboardCache()
+    scoreboard = {"round_id": 1, "scores": []}
+    assert one.put(1, one.version(1), scoreboard).etag == other.put(1, other.version(1), scoreboard).etag
+    assert one.put(1, one.version(1), {"round_id": 1, "scores": [1]}).etag != other.get(1).etag
+
+
+def test_result_read_before_an_invalidation_is_not_cached():
+    cache = ScoreboardCache()
+    version = cache.version(1)
+    cache.invalidate(1)
+    cache.put(1, version, {"round_id": 1})
+    assert cache.get(1) is None